@@ -0,0 +1,256 @@
+"""
+Reproducible benchmarks for DAG and DataFlowGraph.
+
+Every graph comes from a seeded generator, so two runs of the same size preset
+measure exactly the same graphs. Results are written as JSON and can be compared
+against an earlier run:
+
+    python bench.py --size small --output before.json
+    python bench.py --size small --output after.json --compare before.json
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dag import DAG
+from dfg import DataFlowGraph
+
+Edge = Tuple[int, int]
+
+
+def chain_edges(n: int, seed: int = 0) -> List[Edge]:
+    """A single path 0 -> 1 -> ... -> n - 1, the worst case for recursion depth."""
+    return [(i, i + 1) for i in range(n - 1)]
+
+
+def fan_edges(n: int, seed: int = 0) -> List[Edge]:
+    """Vertex 0 fans out to n - 2 independent vertices that all fan back into vertex n - 1."""
+    middle = range(1, n - 1)
+    return [(0, i) for i in middle] + [(i, n - 1) for i in middle]
+
+
+def layered_edges(layers: int, width: int, fanout: int, seed: int = 0) -> List[Edge]:
+    """
+    `layers` layers of `width` vertices each; every vertex outside the first layer
+    gets `fanout` distinct random predecessors from the layer above.
+    """
+    rng = random.Random(seed)
+    edges = []
+    for layer in range(1, layers):
+        above = range((layer - 1) * width, layer * width)
+        for vertex in range(layer * width, (layer + 1) * width):
+            edges.extend((predecessor, vertex) for predecessor in rng.sample(above, min(fanout, width)))
+    return edges
+
+
+def dense_random_edges(n: int, p: float, seed: int = 0) -> List[Edge]:
+    """
+    Every pair `i < j` becomes an edge with probability `p`, like the graph in
+    `dag.py`'s `__main__`. Gaps between edges are drawn from a geometric
+    distribution, so generation costs O(E) random numbers instead of O(V^2).
+    """
+    rng = random.Random(seed)
+    if p >= 1:
+        return [(i, j) for i in range(n) for j in range(i + 1, n)]
+    if p <= 0:
+        return []
+    log_q = math.log(1 - p)
+    edges = []
+    for i in range(n):
+        j = i + 1 + int(math.log(1 - rng.random()) / log_q)
+        while j < n:
+            edges.append((i, j))
+            j += 1 + int(math.log(1 - rng.random()) / log_q)
+    return edges
+
+
+GENERATORS: Dict[str, Callable[..., List[Edge]]] = {
+    'chain': chain_edges,
+    'fan': fan_edges,
+    'layered': layered_edges,
+    'dense_random': dense_random_edges,
+}
+
+SIZES: Dict[str, List[Tuple[str, dict]]] = {
+    'tiny': [
+        ('chain', {'n': 100}),
+        ('fan', {'n': 100}),
+        ('layered', {'layers': 5, 'width': 20, 'fanout': 2}),
+        ('dense_random', {'n': 50, 'p': 0.5}),
+    ],
+    'small': [
+        ('chain', {'n': 10_000}),
+        ('fan', {'n': 10_000}),
+        ('layered', {'layers': 20, 'width': 500, 'fanout': 3}),
+        ('dense_random', {'n': 500, 'p': 0.5}),
+    ],
+    'medium': [
+        ('chain', {'n': 100_000}),
+        ('fan', {'n': 100_000}),
+        ('layered', {'layers': 50, 'width': 2_000, 'fanout': 4}),
+        ('dense_random', {'n': 2_000, 'p': 0.5}),
+    ],
+    'large': [
+        ('chain', {'n': 1_000_000}),
+        ('fan', {'n': 1_000_000}),
+        ('layered', {'layers': 100, 'width': 10_000, 'fanout': 4}),
+        ('dense_random', {'n': 5_000, 'p': 0.5}),
+    ],
+}
+
+
+def _time(function: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _build_dag(edges: List[Edge]) -> DAG:
+    dag = DAG()
+    for from_vertex, to_vertex in edges:
+        dag.add_edge(from_vertex, to_vertex)
+    return dag
+
+
+def _build_pipeline(edges: List[Edge]) -> Tuple[DataFlowGraph, str]:
+    """Wrap the graph in a DataFlowGraph of cheap arithmetic nodes behind a single entry node."""
+    dfg = DataFlowGraph()
+    dfg.add_edges_from(edges)
+    sources = [vertex for vertex, degree in dfg.in_degrees().items() if degree == 0]
+    for vertex in list(dfg.graph):
+        dfg.add_operation(vertex, lambda x: x + 1)
+    dfg.add_operation('source', lambda x: x)
+    dfg.add_edges_from(('source', vertex) for vertex in sources)
+    return dfg, 'source'
+
+
+def bench_case(generator: str, params: dict, repeat: int = 3, seed: int = 0, calls: int = 10) -> List[dict]:
+    """Run every measurement on one generated graph and return one record per operation."""
+    edges = GENERATORS[generator](seed=seed, **params)
+    dag = _build_dag(edges)
+    info = {
+        'generator': generator,
+        'params': params,
+        'seed': seed,
+        'vertices': len(dag.graph),
+        'edges': len(edges),
+    }
+
+    measurements = {
+        'construct.add_edge': _time(lambda: _build_dag(edges), repeat),
+        'construct.add_edges_from': _time(lambda: DAG().add_edges_from(edges), repeat),
+    }
+    for method in ('iterative', 'recursive'):
+        # Drop cached analyses so every run measures the full algorithm
+        measurements[f'topological_sort.{method}'] = _time(
+            lambda: dag.topological_sort(method), repeat, dag.invalidate_cache)
+        measurements[f'has_cycle.{method}'] = _time(lambda: dag.has_cycle(method), repeat, dag.invalidate_cache)
+
+    dfg, start_node = _build_pipeline(edges)
+    dfg.process_data(0, start_node)  # warm the cached execution order
+
+    def run_pipeline():
+        for _ in range(calls):
+            dfg.process_data(0, start_node)
+
+    measurements['process_data'] = [t / calls for t in _time(run_pipeline, repeat)]
+
+    records = []
+    for operation, timings in measurements.items():
+        record = dict(info, operation=operation, repeat=repeat, best=min(timings),
+                      mean=sum(timings) / len(timings))
+        if operation == 'process_data':
+            record['calls_per_second'] = 1 / record['best']
+        records.append(record)
+    return records
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(size: str = 'small', repeat: int = 3, seed: int = 0, calls: int = 10,
+        generators: Optional[List[str]] = None) -> dict:
+    """Run a size preset and return the report as a JSON-serializable dictionary."""
+    results = []
+    for generator, params in SIZES[size]:
+        if generators is None or generator in generators:
+            results.extend(bench_case(generator, params, repeat=repeat, seed=seed, calls=calls))
+    return {
+        'meta': {
+            'size': size,
+            'repeat': repeat,
+            'seed': seed,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        },
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict) -> List[dict]:
+    """Pair up matching measurements of two reports; `ratio` > 1 means the new run is slower."""
+    def key(record):
+        return record['generator'], json.dumps(record['params'], sort_keys=True), record['operation']
+
+    previous = {key(record): record for record in baseline['results']}
+    rows = []
+    for record in report['results']:
+        old = previous.get(key(record))
+        if old is not None:
+            rows.append({'generator': record['generator'], 'operation': record['operation'],
+                         'before': old['best'], 'after': record['best'],
+                         'ratio': record['best'] / old['best'] if old['best'] else float('inf')})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', choices=SIZES, default='small')
+    parser.add_argument('--generator', action='append', choices=GENERATORS,
+                        help='Only run the given generator (repeatable)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--calls', type=int, default=10, help='process_data calls per timing')
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='Earlier report to compare against')
+    args = parser.parse_args(argv)
+
+    report = run(args.size, repeat=args.repeat, seed=args.seed, calls=args.calls, generators=args.generator)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    for record in report['results']:
+        print(f"{record['generator']:>13} V={record['vertices']:<9} E={record['edges']:<10} "
+              f"{record['operation']:<26} {record['best'] * 1000:10.3f} ms")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print()
+        for row in compare(report, baseline):
+            print(f"{row['generator']:>13} {row['operation']:<26} {row['before'] * 1000:10.3f} ms "
+                  f"-> {row['after'] * 1000:10.3f} ms  x{row['ratio']:.2f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
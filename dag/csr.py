@@ -0,0 +1,233 @@
+import mmap as _mmap
+import pickle
+import struct
+import sys
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+# Snapshot layout (little-endian, every section starts on an 8-byte boundary):
+#   header   magic, vertex count, edge count, label table size, ID width, flags
+#   offsets  int64[V + 1]
+#   targets  int32 or int64[E]   (ID width from the header)
+#   order    int32 or int64[V]   (only when FLAG_HAS_ORDER is set)
+#   labels   pickled list of vertex labels
+SNAPSHOT_MAGIC = b'DAGCSR01'
+SNAPSHOT_HEADER = struct.Struct('<8sQQQBB6x')
+FLAG_HAS_ORDER = 1
+
+
+def _index_typecode(upper_bound: int) -> str:
+    """Smallest signed array typecode able to hold integers below `upper_bound`."""
+    return 'i' if upper_bound < 2 ** 31 else 'q'
+
+
+def _as_typecode(values, typecode: str):
+    """Convert an integer array-like to a contiguous buffer with the given array typecode."""
+    try:
+        import numpy as np
+    except ImportError:
+        return array(typecode, values)
+    return np.ascontiguousarray(values, dtype=typecode)
+
+
+class CSRAdjacency(Mapping):
+    """
+    Read-only adjacency stored in compressed-sparse-row (CSR) form.
+
+    Vertices are interned to dense integer IDs in insertion order. The successors
+    of the vertex with ID `i` are `targets[offsets[i]:offsets[i + 1]]`, so the whole
+    edge set lives in two flat integer buffers instead of one Python list per vertex.
+
+    The class implements the read side of the `dict` interface used by `DAG.graph`
+    (`graph[v]`, `v in graph`, iteration and `len`), which lets the existing algorithms
+    run on top of it unchanged. `graph[v]` decodes the successor labels on every
+    access, so hot paths should use the integer-level helpers instead.
+
+    Attributes:
+        labels: A list mapping vertex IDs back to the original vertex objects.
+        index: A dictionary mapping vertex objects to their IDs.
+        offsets: An integer buffer of length V + 1 with the start of each adjacency run.
+        targets: An integer buffer of length E with the successor IDs.
+    """
+
+    def __init__(self, labels: List[Hashable], offsets, targets, index: Optional[Dict[Hashable, int]] = None):
+        self.labels = labels
+        self.index = index if index is not None else {vertex: i for i, vertex in enumerate(labels)}
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_dict(cls, graph: Dict[Hashable, list]) -> 'CSRAdjacency':
+        """Build a CSR adjacency from a dict-of-lists adjacency."""
+        labels = list(graph)
+        index = {vertex: i for i, vertex in enumerate(labels)}
+        num_edges = sum(map(len, graph.values()))
+
+        offsets = array(_index_typecode(num_edges + 1), [0])
+        targets = array(_index_typecode(len(labels)))
+        for neighbors in graph.values():
+            targets.extend([index[neighbor] for neighbor in neighbors])
+            offsets.append(len(targets))
+
+        return cls(labels, offsets, targets, index)
+
+    @classmethod
+    def from_buffers(cls, labels: List[Hashable], offsets, targets) -> 'CSRAdjacency':
+        """Build a CSR adjacency from integer array-likes (e.g. NumPy arrays) of offsets and targets."""
+        offsets_array = array(_index_typecode(int(offsets[-1]) + 1))
+        offsets_array.frombytes(memoryview(_as_typecode(offsets, offsets_array.typecode)).cast('B'))
+        targets_array = array(_index_typecode(len(labels)))
+        targets_array.frombytes(memoryview(_as_typecode(targets, targets_array.typecode)).cast('B'))
+        return cls(labels, offsets_array, targets_array)
+
+    def to_dict(self) -> Dict[Hashable, list]:
+        """Decode the CSR buffers back into a mutable dict-of-lists adjacency."""
+        labels, offsets, targets = self.labels, self.offsets, self.targets
+        return {
+            vertex: [labels[t] for t in targets[offsets[i]:offsets[i + 1]]]
+            for i, vertex in enumerate(labels)
+        }
+
+    def __getitem__(self, vertex) -> List[Hashable]:
+        i = self.index[vertex]
+        labels = self.labels
+        return [labels[t] for t in self.targets[self.offsets[i]:self.offsets[i + 1]]]
+
+    def __contains__(self, vertex) -> bool:
+        return vertex in self.index
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(vertices={len(self.labels)}, edges={len(self.targets)})'
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.targets)
+
+    def successor_ids(self, i: int):
+        """Return the successor IDs of vertex ID `i` as a slice of the targets buffer."""
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def in_degree_ids(self) -> List[int]:
+        """Count incoming edges per vertex ID, using NumPy when it is installed."""
+        n = len(self.labels)
+        try:
+            import numpy as np
+        except ImportError:
+            in_degree = [0] * n
+            for t in self.targets:
+                in_degree[t] += 1
+            return in_degree
+
+        return np.bincount(np.asarray(memoryview(self.targets)), minlength=n).tolist()
+
+    def topological_sort_ids(self) -> List[int]:
+        """
+        Kahn's algorithm over vertex IDs.
+
+        Returns:
+            List[int]: The vertex IDs in topological order.
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        offsets, targets = self.offsets, self.targets
+        in_degree = self.in_degree_ids()
+        zero_in_degree = deque([i for i, degree in enumerate(in_degree) if degree == 0])
+        topological_order = []
+
+        while zero_in_degree:
+            i = zero_in_degree.popleft()
+            topological_order.append(i)
+            for t in targets[offsets[i]:offsets[i + 1]]:
+                in_degree[t] -= 1
+                if in_degree[t] == 0:
+                    zero_in_degree.append(t)
+
+        if len(topological_order) != len(self.labels):
+            raise ValueError("Graph has at least one cycle")
+
+        return topological_order
+
+    def topological_sort(self) -> List[Hashable]:
+        labels = self.labels
+        return [labels[i] for i in self.topological_sort_ids()]
+
+
+def _padded(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def save_snapshot(path, csr: CSRAdjacency, order: Optional[Sequence[int]] = None):
+    """
+    Write a CSR adjacency, and optionally a topological order of its vertex IDs, to `path`.
+
+    The integer sections are stored exactly as they are laid out in memory, so
+    `load_snapshot` can map them without parsing.
+    """
+    id_typecode = _index_typecode(len(csr.labels))
+    sections = [array('q', csr.offsets), array(id_typecode, csr.targets)]
+    if order is not None:
+        sections.append(array(id_typecode, order))
+    if sys.byteorder != 'little':
+        for section in sections:
+            section.byteswap()
+    labels = pickle.dumps(list(csr.labels), protocol=pickle.HIGHEST_PROTOCOL)
+
+    with open(path, 'wb') as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(csr.labels), len(csr.targets), len(labels),
+                                        array(id_typecode).itemsize, FLAG_HAS_ORDER if order is not None else 0))
+        for section in sections:
+            data = section.tobytes()
+            file.write(data)
+            file.write(bytes(_padded(len(data)) - len(data)))
+        file.write(labels)
+
+
+def load_snapshot(path, mmap: bool = True) -> Tuple[CSRAdjacency, Optional[Sequence[int]]]:
+    """
+    Read a snapshot written by `save_snapshot`.
+
+    Args:
+        path: The snapshot file.
+        mmap: Map the file read-only and use the integer sections in place. Processes
+            that load the same file share its pages through the OS page cache. Otherwise
+            the sections are copied into `array` buffers.
+
+    Returns:
+        tuple: The CSR adjacency and the stored order of vertex IDs (None if absent).
+    """
+    with open(path, 'rb') as file:
+        if mmap:
+            buffer = memoryview(_mmap.mmap(file.fileno(), 0, access=_mmap.ACCESS_READ))
+        else:
+            buffer = memoryview(file.read())
+
+    magic, num_vertices, num_edges, labels_size, id_size, flags = SNAPSHOT_HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a DAG snapshot")
+    id_typecode = 'i' if id_size == 4 else 'q'
+
+    position = SNAPSHOT_HEADER.size
+    sections = []
+    for typecode, count in [('q', num_vertices + 1), (id_typecode, num_edges),
+                            (id_typecode, num_vertices if flags & FLAG_HAS_ORDER else 0)]:
+        size = count * array(typecode).itemsize
+        section = buffer[position:position + size].cast(typecode)
+        if not mmap or sys.byteorder != 'little':
+            section = array(typecode, section)
+            if sys.byteorder != 'little':
+                section.byteswap()
+        sections.append(section)
+        position += _padded(size)
+    offsets, targets, order = sections
+
+    labels = pickle.loads(buffer[position:position + labels_size])
+    return CSRAdjacency(labels, offsets, targets), order if flags & FLAG_HAS_ORDER else None
@@ -1,95 +1,672 @@
+import csv
 import random
 import time
-from collections import deque
-from typing import List, Literal
+from collections import Counter, deque
+from itertools import islice
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Literal, Optional, Sequence, Tuple
+
+from csr import CSRAdjacency, load_snapshot, save_snapshot
+from export import export as export_graph
+from layout import Group, Layout, layered_layout
+
+
+def _as_edge_array(edges):
+    import numpy as np
+
+    edges = np.asarray(edges)
+    if edges.ndim != 2 or edges.shape[1] != 2:
+        raise ValueError(f"Expected an array of shape (E, 2), got {edges.shape}")
+    if not np.issubdtype(edges.dtype, np.integer):
+        raise ValueError(f"Expected integer vertex IDs, got {edges.dtype}")
+    if len(edges) and edges.min() < 0:
+        raise ValueError("Vertex IDs must be non-negative")
+    return edges
+
+
+def _stable_argsort_ids(ids):
+    """
+    Stable argsort of non-negative integer IDs.
+
+    Sorts 16 bits at a time (least significant first), because NumPy radix-sorts 16-bit
+    keys in linear time, while a stable sort of wider integers is a merge sort.
+    """
+    import numpy as np
+
+    order = np.argsort((ids & 0xFFFF).astype(np.uint16), kind='stable')
+    top = int(ids.max()) if len(ids) else 0
+    shift = 16
+    while top >> shift:
+        digits = ((ids[order] >> shift) & 0xFFFF).astype(np.uint16)
+        order = order[np.argsort(digits, kind='stable')]
+        shift += 16
+    return order
+
+
+def _group_by_source(edges):
+    """Stable-sort an `(E, 2)` edge array by source; return sources, targets and group starts."""
+    import numpy as np
+
+    by_source = _stable_argsort_ids(edges[:, 0])
+    sources = edges[by_source, 0]
+    targets = edges[by_source, 1]
+    starts = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]]) if len(sources) else np.zeros(0, dtype=np.intp)
+    return sources, targets, starts
+
+
+# Marks the maintained-order slot of a removed vertex until the order is compacted
+_REMOVED = object()
+
+
+def _decode_bits(bits: int, order: Sequence) -> List:
+    """Return `order[i]` for every set bit `i` of `bits`, in ascending bit order."""
+    return [order[i] for i, digit in enumerate(reversed(bin(bits))) if digit == '1']
+
+
+class CycleError(ValueError):
+    """
+    Raised when a graph contains, or an edge would create, a cycle.
+
+    Attributes:
+        cycle: The vertices along the offending cycle, starting and ending with the same vertex.
+    """
+
+    def __init__(self, message, cycle=None):
+        super().__init__(message)
+        self.cycle = cycle
 
 
 class DAG:
-    def __init__(self):
+    def __init__(self, maintain_order: bool = False, track_predecessors: bool = False):
+        """
+        Args:
+            maintain_order: Keep a topological order up to date on every `add_edge`
+                (Pearce-Kelly). Edges that would close a cycle are rejected with a
+                `CycleError`, and `topological_sort()` becomes an O(V) read.
+            track_predecessors: Keep a reverse adjacency index and live in-degree counts
+                up to date on every change, so that `predecessors`, `in_degree`,
+                `remove_edge` and `remove_vertex` cost O(degree) instead of a scan of the
+                whole graph. Always on with `maintain_order`. Edits made directly to
+                `graph` bypass the index.
+        """
         self.graph = {}
+        self.maintain_order = maintain_order
+        self.track_predecessors = track_predecessors or maintain_order
+        # Derived analyses are cached against the mutation counter
+        self._version = 0
+        self._cache = {}
+        self._cache_version = 0
+        # Optional costs for path analyses; edge weights are keyed by (from_vertex, to_vertex)
+        self.vertex_weights = {}
+        self.edge_weights = {}
+        if maintain_order:
+            self._order = []  # position -> vertex, or _REMOVED
+            self._position = {}  # vertex -> position
+            self._removed = 0  # _REMOVED slots in the order
+        if self.track_predecessors:
+            self._predecessors = {}  # vertex -> list of vertices with an edge into it
+            self._in_degree = {}  # vertex -> number of edges into it
+
+    @property
+    def version(self) -> int:
+        """A counter that increases whenever a vertex or edge is added or removed."""
+        return self._version
+
+    def invalidate_cache(self):
+        """
+        Drop every cached analysis.
+
+        Modifications through the `add_*` methods invalidate the cache automatically;
+        call this after editing `self.graph` directly.
+        """
+        self._version += 1
+
+    def _cached(self, key, compute):
+        """Return the cached result of `compute()` for the current graph version."""
+        if self._cache_version != self._version:
+            self._cache.clear()
+            self._cache_version = self._version
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = compute()
+            return value
+
+    @property
+    def frozen(self) -> bool:
+        return isinstance(self.graph, CSRAdjacency)
+
+    def freeze(self) -> 'DAG':
+        """
+        Switch the graph to the compact, read-only CSR storage backend.
+
+        Vertices are interned to dense integer IDs and the adjacency is packed into
+        two flat integer arrays, which drops the per-vertex list objects of the
+        dict-of-lists representation. Analyses keep working on a frozen graph;
+        adding new vertices or edges raises until `thaw()` is called.
+
+        Returns:
+            DAG: The graph itself, to allow `dag = DAG(...).freeze()` style chaining.
+        """
+        if not self.frozen:
+            self.graph = CSRAdjacency.from_dict(self.graph)
+        return self
+
+    def thaw(self) -> 'DAG':
+        """Switch a frozen graph back to the mutable dict-of-lists storage."""
+        if self.frozen:
+            self.graph = self.graph.to_dict()
+        return self
+
+    def save(self, path, include_order: bool = True):
+        """
+        Save the graph to a compact binary snapshot.
+
+        The file holds the CSR offsets and targets, the vertex labels (pickled) and,
+        when `include_order` is set and the graph is acyclic, its topological order, so
+        a loaded graph can answer `topological_sort()` without sorting again.
+        """
+        csr = self.graph if self.frozen else CSRAdjacency.from_dict(self.graph)
+        order = None
+        if include_order and not self.has_cycle():
+            order = [csr.index[vertex] for vertex in self._topological_order()]
+        save_snapshot(path, csr, order)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> 'DAG':
+        """
+        Load a snapshot written by `save` as a frozen graph.
 
-    def add_vertex(self, vertex):
+        With `mmap=True` the adjacency is used straight from the memory-mapped file, so
+        worker processes loading the same snapshot share one read-only copy. Call
+        `thaw()` on the result to modify it.
+        """
+        csr, order = load_snapshot(path, mmap=mmap)
+        dag = cls()
+        dag.graph = csr
+        if order is not None:
+            labels = csr.labels
+            dag._cache['topological_order'] = [labels[i] for i in order]
+        return dag
+
+    def _rebuild_indexes(self):
+        """Rebuild the maintained order and predecessor index after `graph` was replaced wholesale."""
+        if self.track_predecessors:
+            predecessors = {vertex: [] for vertex in self.graph}
+            for vertex in self.graph:
+                for neighbor in self.graph[vertex]:
+                    predecessors[neighbor].append(vertex)
+            self._predecessors = predecessors
+            self._in_degree = {vertex: len(incoming) for vertex, incoming in predecessors.items()}
+        if self.maintain_order:
+            self.maintain_order = False
+            try:
+                order = self._topological_order()
+            except ValueError:
+                raise CycleError("Graph has at least one cycle", self._find_cycle()) from None
+            finally:
+                self.maintain_order = True
+            self._order = list(order)
+            self._position = {vertex: i for i, vertex in enumerate(order)}
+            self._removed = 0
+
+    def _check_mutable(self):
+        if self.frozen:
+            raise RuntimeError("DAG is frozen; call thaw() before modifying it")
+
+    def add_vertex(self, vertex, weight: Optional[float] = None):
         if vertex not in self.graph:
+            self._check_mutable()
+            self._version += 1
             self.graph[vertex] = []
+            if self.maintain_order:
+                self._position[vertex] = len(self._order)
+                self._order.append(vertex)
+            if self.track_predecessors:
+                self._predecessors[vertex] = []
+                self._in_degree[vertex] = 0
+        if weight is not None:
+            self.vertex_weights[vertex] = weight
 
-    def add_edge(self, from_vertex, to_vertex):
+    def add_edge(self, from_vertex, to_vertex, weight: Optional[float] = None):
+        graph = self.graph
+        if not self.track_predecessors and type(graph) is dict:
+            # Plain mutable graph: nothing to keep in sync but the version
+            if from_vertex not in graph:
+                graph[from_vertex] = []
+            if to_vertex not in graph:
+                graph[to_vertex] = []
+            graph[from_vertex].append(to_vertex)
+            self._version += 1
+            if weight is not None:
+                self.edge_weights[from_vertex, to_vertex] = weight
+            return
+        self._check_mutable()
+        if self.maintain_order and from_vertex == to_vertex:
+            raise CycleError(f"Edge {from_vertex!r} -> {to_vertex!r} would create a cycle",
+                             [from_vertex, to_vertex])
         if from_vertex not in self.graph:
             self.add_vertex(from_vertex)
         if to_vertex not in self.graph:
             self.add_vertex(to_vertex)
+        if self.maintain_order:
+            self._update_order(from_vertex, to_vertex)
+        if self.track_predecessors:
+            self._predecessors[to_vertex].append(from_vertex)
+            self._in_degree[to_vertex] += 1
+        self._version += 1
         self.graph[from_vertex].append(to_vertex)
+        if weight is not None:
+            self.edge_weights[from_vertex, to_vertex] = weight
+
+    def remove_edge(self, from_vertex, to_vertex):
+        """
+        Remove one edge `from_vertex -> to_vertex` (one copy, if there are parallel edges).
+
+        Costs O(out-degree of `from_vertex` + in-degree of `to_vertex`) when predecessors
+        are tracked. Removing an edge never invalidates a maintained topological order.
+
+        Raises:
+            KeyError: If there is no such edge.
+        """
+        self._check_mutable()
+        neighbors = self.graph.get(from_vertex)
+        if neighbors is None or to_vertex not in neighbors:
+            raise KeyError(f"Edge {from_vertex!r} -> {to_vertex!r} not found in graph")
+        self._version += 1
+        neighbors.remove(to_vertex)
+        if self.track_predecessors:
+            self._predecessors[to_vertex].remove(from_vertex)
+            self._in_degree[to_vertex] -= 1
+        if to_vertex not in neighbors:
+            self.edge_weights.pop((from_vertex, to_vertex), None)
+
+    def remove_vertex(self, vertex):
+        """
+        Remove a vertex together with every edge into or out of it, and its weights.
+
+        Costs O(degree of the vertex and of its neighbors) when predecessors are tracked;
+        otherwise every adjacency list is scanned for edges into the vertex.
+
+        Raises:
+            KeyError: If the vertex is not in the graph.
+        """
+        self._check_mutable()
+        if vertex not in self.graph:
+            raise KeyError(f"Vertex {vertex!r} not found in graph")
+        self._version += 1
+        successors = self.graph.pop(vertex)
+        if self.track_predecessors:
+            predecessors = self._predecessors.pop(vertex)
+            del self._in_degree[vertex]
+            for successor in dict.fromkeys(successors):
+                if successor != vertex:
+                    incoming = self._predecessors[successor]
+                    incoming[:] = [p for p in incoming if p != vertex]
+                    self._in_degree[successor] = len(incoming)
+        else:
+            predecessors = [p for p, neighbors in self.graph.items() if vertex in neighbors]
+        for predecessor in dict.fromkeys(predecessors):
+            if predecessor != vertex:
+                neighbors = self.graph[predecessor]
+                neighbors[:] = [n for n in neighbors if n != vertex]
+                self.edge_weights.pop((predecessor, vertex), None)
+        for successor in successors:
+            self.edge_weights.pop((vertex, successor), None)
+        self.vertex_weights.pop(vertex, None)
+        if self.maintain_order:
+            # Leave a hole; the order is compacted the next time it is read
+            self._order[self._position.pop(vertex)] = _REMOVED
+            self._removed += 1
+
+    def _compact_order(self):
+        self._order = [vertex for vertex in self._order if vertex is not _REMOVED]
+        self._position = {vertex: i for i, vertex in enumerate(self._order)}
+        self._removed = 0
 
-    def _has_cycle_util(self, vertex, visited, rec_stack):
+    def add_edges_from(self, edges: Iterable[Tuple[Hashable, Hashable]], dedupe: bool = False,
+                       vertices: Optional[Iterable[Hashable]] = None):
         """
-        A utility function to detect a cycle in a directed graph using DFS.
+        Add many edges in one call.
+
+        Equivalent to calling `add_edge` for every pair, but the loop binds the adjacency
+        dictionary locally and does a single lookup per endpoint, which removes most of the
+        per-edge interpreter overhead.
 
         Args:
-            vertex: The current vertex being explored.
-            visited: A dictionary that tracks whether each vertex has been visited.
-            rec_stack: A dictionary that tracks the vertices currently in the recursion stack.
+            edges: An iterable of `(from_vertex, to_vertex)` pairs. It is consumed lazily.
+            dedupe: Drop parallel edges from the adjacency lists of every source vertex
+                touched by this call (the first occurrence of each edge is kept).
+            vertices: Vertices to register up front, in order. When the full vertex set is
+                known, registering it in one pass fixes the vertex order and lets the edge
+                loop skip inserting new dictionary entries.
+        """
+        self._check_mutable()
+        if vertices is not None:
+            for vertex in vertices:
+                self.add_vertex(vertex)
 
-        Returns:
-            bool: True if a cycle is detected, False otherwise.
+        if self.maintain_order:
+            # Every edge has to be checked against the maintained order
+            touched = set()
+            for from_vertex, to_vertex in edges:
+                if not dedupe or to_vertex not in self.graph.get(from_vertex, ()):
+                    self.add_edge(from_vertex, to_vertex)
+                touched.add(from_vertex)
+            if dedupe:
+                self._dedupe_neighbors(touched)
+            return
+        if self.track_predecessors:
+            self._add_edges_tracked(edges, dedupe)
+            return
+
+        self._version += 1
+        graph = self.graph
+        touched = set() if dedupe else None
+        for from_vertex, to_vertex in edges:
+            neighbors = graph.get(from_vertex)
+            if neighbors is None:
+                neighbors = graph[from_vertex] = []
+            neighbors.append(to_vertex)
+            if to_vertex not in graph:
+                graph[to_vertex] = []
+            if dedupe:
+                touched.add(from_vertex)
+
+        if dedupe:
+            self._dedupe_neighbors(touched)
+
+    def _add_edges_tracked(self, edges, dedupe):
+        """The `add_edges_from` loop for graphs that keep the predecessor index up to date."""
+        self._version += 1
+        graph, predecessors, in_degree = self.graph, self._predecessors, self._in_degree
+        touched = set() if dedupe else None
+        for from_vertex, to_vertex in edges:
+            neighbors = graph.get(from_vertex)
+            if neighbors is None:
+                neighbors = graph[from_vertex] = []
+                predecessors[from_vertex] = []
+                in_degree[from_vertex] = 0
+            neighbors.append(to_vertex)
+            if dedupe:
+                touched.add(from_vertex)
+            incoming = predecessors.get(to_vertex)
+            if incoming is None:
+                graph[to_vertex] = []
+                incoming = predecessors[to_vertex] = []
+                in_degree[to_vertex] = 0
+            incoming.append(from_vertex)
+            in_degree[to_vertex] += 1
+
+        if dedupe:
+            self._dedupe_neighbors(touched)
+
+    def add_edge_array(self, edges, labels: Optional[Sequence[Hashable]] = None, dedupe: bool = False):
         """
-        visited[vertex] = True
-        rec_stack[vertex] = True
+        Add edges from a NumPy integer array of shape `(E, 2)`.
 
-        for neighbor in self.graph[vertex]:
-            if not visited[neighbor]:
-                if self._has_cycle_util(neighbor, visited, rec_stack):
-                    return True
-            elif rec_stack[neighbor]:
-                return True
+        Edges are grouped by source with a stable sort, so every adjacency list is extended
+        once instead of once per edge, keeping the input order within each list. New
+        vertices are registered in ascending ID order.
 
-        rec_stack[vertex] = False
-        return False
+        Args:
+            edges: An `(E, 2)` array-like of non-negative integer vertex IDs.
+            labels: Optional sequence mapping the IDs to vertex objects (`labels[i]` is the
+                vertex for ID `i`). Without it the IDs themselves become the vertices.
+            dedupe: Drop parallel edges, as in `add_edges_from`.
+        """
+        import numpy as np
 
-    def _has_cycle_recursive(self):
-        # visited is a dictionary that keeps track of the vertices that have been visited
-        visited = {vertex: False for vertex in self.graph}
-        # rec_stack is a dictionary that keeps track of the vertices that are currently in the recursion stack
-        rec_stack = {vertex: False for vertex in self.graph}
+        self._check_mutable()
+        edges = _as_edge_array(edges)
+        if labels is not None:
+            labels = np.asarray(labels, dtype=object)
 
-        for vertex in self.graph:
-            if not visited[vertex]:
-                if self._has_cycle_util(vertex, visited, rec_stack):
-                    return True
-        return False
+        def decode(ids):
+            return (labels[ids] if labels is not None else ids).tolist()
 
-    def _has_cycle_iterative(self) -> bool:
-        try:
-            self.topological_sort('iterative')
-            return False
-        except ValueError:
-            return True
+        if self.track_predecessors:
+            self.add_edges_from(zip(decode(edges[:, 0]), decode(edges[:, 1])), dedupe=dedupe)
+            return
+
+        self._version += 1
+        graph = self.graph
+        for vertex in decode(np.flatnonzero(np.bincount(edges.ravel()))):
+            if vertex not in graph:
+                graph[vertex] = []
 
-    def _topological_sort_util(self, vertex, visited, stack):
+        sources, targets, starts = _group_by_source(edges)
+        group_sources = decode(sources[starts])
+        targets = decode(targets)
+        ends = starts[1:].tolist() + [len(targets)]
+        for from_vertex, start, end in zip(group_sources, starts.tolist(), ends):
+            graph[from_vertex].extend(targets[start:end])
+
+        if dedupe:
+            self._dedupe_neighbors(group_sources)
+
+    @classmethod
+    def from_edge_array(cls, edges, labels: Optional[Sequence[Hashable]] = None, dedupe: bool = False,
+                        **kwargs) -> 'DAG':
         """
-        A utility function to perform a topological sort on a directed graph using DFS.
+        Build a frozen graph straight from a NumPy integer array of shape `(E, 2)`.
+
+        The CSR buffers are filled from the array without creating a Python object per
+        edge, which makes this the fastest way to load a large graph for analysis.
+        Call `thaw()` on the result to modify it.
 
         Args:
-            vertex: The current vertex being explored.
-            visited: A dictionary that tracks whether each vertex has been visited.
-            stack: A list that stores the vertices in topologically sorted order.
+            edges: An `(E, 2)` array-like of non-negative integer vertex IDs.
+            labels: Optional sequence of vertex objects; `labels[i]` is the vertex for ID `i`.
+                Defaults to the IDs `0..max_id`. Every label becomes a vertex, including
+                those without edges.
+            dedupe: Drop parallel edges, keeping the first occurrence.
+            **kwargs: Passed on to the constructor.
+        """
+        import numpy as np
+
+        edges = _as_edge_array(edges)
+        num_vertices = int(edges.max()) + 1 if len(edges) else 0
+        if labels is None:
+            labels = list(range(num_vertices))
+        elif len(labels) < num_vertices:
+            raise ValueError(f"Edge array refers to vertex ID {num_vertices - 1} but only {len(labels)} labels were given")
+        else:
+            labels = list(labels)
+
+        if dedupe and len(edges):
+            # In int64, so that the keys of int32 (or narrower) IDs cannot overflow
+            keys = edges[:, 0].astype(np.int64) * len(labels) + edges[:, 1]
+            _, first_seen = np.unique(keys, return_index=True)
+            edges = edges[np.sort(first_seen)]
+
+        # A counting sort: the offsets come from the source counts, and a stable sort by
+        # source puts the targets in CSR order. Narrowing the IDs to the width the CSR
+        # buffers use halves the memory traffic of the gathers.
+        if len(labels) < 2 ** 31:
+            edges = edges.astype(np.int32, copy=False)
+        targets = edges[_stable_argsort_ids(edges[:, 0]), 1]
+        offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edges[:, 0], minlength=len(labels)), out=offsets[1:])
 
-        This function marks the current vertex as visited, recursively visits all its unvisited neighbors,
-        and then adds the current vertex to the stack, ensuring that all its dependencies are added before it.
+        dag = cls(**kwargs)
+        dag.graph = CSRAdjacency.from_buffers(labels, offsets, targets)
+        dag._rebuild_indexes()
+        return dag
+
+    def load_edgelist(self, path, delimiter: Optional[str] = None, vertex_type: Callable = str,
+                      comments: str = '#', header: bool = False, chunk_size: int = 100_000,
+                      dedupe: bool = False):
         """
-        visited[vertex] = True
-        for neighbor in self.graph[vertex]:
-            if not visited[neighbor]:
-                self._topological_sort_util(neighbor, visited, stack)
-        stack.insert(0, vertex)
+        Stream edges from an edge-list or CSV file.
 
-    def _topological_sort_recursive(self):
-        visited = {vertex: False for vertex in self.graph}
-        stack = []
+        The file is read `chunk_size` lines at a time and each chunk goes through
+        `add_edges_from`, so memory use does not depend on the file size. Every line holds
+        one edge as its first two fields; any further fields (e.g. weights) are ignored.
+
+        Args:
+            path: The file to read.
+            delimiter: Field delimiter, e.g. `','` for CSV (parsed with the `csv` module so
+                quoted fields work). The default splits on whitespace.
+            vertex_type: Callable that converts a field to a vertex, e.g. `int`.
+            comments: Lines starting with this prefix are skipped.
+            header: Skip the first line.
+            chunk_size: Number of lines parsed per batch.
+            dedupe: Drop parallel edges, as in `add_edges_from`.
+        """
+        with open(path, newline='') as file:
+            if header:
+                next(file, None)
+            lines = (line for line in file if line.strip() and not line.startswith(comments))
+            rows = csv.reader(lines, delimiter=delimiter) if delimiter else (line.split() for line in lines)
+            while True:
+                chunk = [(vertex_type(row[0]), vertex_type(row[1])) for row in islice(rows, chunk_size)]
+                if not chunk:
+                    break
+                self.add_edges_from(chunk, dedupe=dedupe)
 
-        for vertex in self.graph:
-            if not visited[vertex]:
-                self._topological_sort_util(vertex, visited, stack)
+    def _dedupe_neighbors(self, vertices):
+        """Collapse the parallel edges out of `vertices`, keeping the predecessor index in step."""
+        graph = self.graph
+        for vertex in vertices:
+            neighbors = graph[vertex]
+            if len(neighbors) > 1:
+                unique = list(dict.fromkeys(neighbors))
+                if len(unique) == len(neighbors):
+                    continue
+                graph[vertex] = unique
+                if self.track_predecessors:
+                    for neighbor, count in Counter(neighbors).items():
+                        if count > 1:
+                            incoming = self._predecessors[neighbor]
+                            for _ in range(count - 1):
+                                incoming.remove(vertex)
+                            self._in_degree[neighbor] -= count - 1
 
-        return stack
+    def _update_order(self, from_vertex, to_vertex):
+        '''
+        Restore the maintained topological order before inserting `from_vertex -> to_vertex`
+        using the Pearce-Kelly dynamic topological sort.
+
+        If `to_vertex` already comes after `from_vertex` nothing changes. Otherwise only
+        the vertices whose positions lie between the two endpoints are examined:
+        1. Search forward from `to_vertex` through vertices positioned before `from_vertex`.
+           Reaching `from_vertex` means the new edge closes a cycle.
+        2. Search backward from `from_vertex` through vertices positioned after `to_vertex`.
+        3. Reassign the positions occupied by both sets so that every backward vertex comes
+           before every forward vertex, keeping each set's relative order.
+
+        Raises:
+            CycleError: If the edge would create a cycle; the graph is left unchanged.
+        '''
+        position = self._position
+        lower, upper = position[to_vertex], position[from_vertex]
+        if lower > upper:
+            return
+
+        # Forward search, remembering parents to report the cycle path
+        parents = {to_vertex: None}
+        stack = [to_vertex]
+        while stack:
+            vertex = stack.pop()
+            for neighbor in self.graph[vertex]:
+                if neighbor == from_vertex:
+                    path = [from_vertex]
+                    while vertex is not None:
+                        path.append(vertex)
+                        vertex = parents[vertex]
+                    path.append(from_vertex)
+                    path.reverse()
+                    raise CycleError(
+                        f"Edge {from_vertex!r} -> {to_vertex!r} would create a cycle: "
+                        + ' -> '.join(map(repr, path)),
+                        path,
+                    )
+                if neighbor not in parents and position[neighbor] < upper:
+                    parents[neighbor] = vertex
+                    stack.append(neighbor)
+        forward = list(parents)
+
+        # Backward search over predecessors
+        visited = {from_vertex}
+        stack = [from_vertex]
+        while stack:
+            vertex = stack.pop()
+            for predecessor in self._predecessors[vertex]:
+                if predecessor not in visited and position[predecessor] > lower:
+                    visited.add(predecessor)
+                    stack.append(predecessor)
+        backward = list(visited)
+
+        # Reuse the freed positions: backward set first, then forward set
+        backward.sort(key=position.__getitem__)
+        forward.sort(key=position.__getitem__)
+        affected = backward + forward
+        slots = sorted(position[vertex] for vertex in affected)
+        for vertex, slot in zip(affected, slots):
+            position[vertex] = slot
+            self._order[slot] = vertex
+
+    def _depth_first_search(self, stop_at_cycle: bool = False):
+        """
+        An explicit-stack depth-first search over every vertex of the graph.
+
+        Each frame on the stack holds an iterator over a vertex's neighbors, so the
+        search resumes where it left off instead of recursing. This keeps deep chains
+        within constant Python stack depth and visits every vertex and edge once.
+
+        Args:
+            stop_at_cycle: Return as soon as a back edge (an edge into a vertex that is
+                still on the stack) is found.
+
+        Returns:
+            tuple: The vertices in DFS post-order, and the first cycle found as a list of
+                vertices starting and ending with the same vertex (None if no back edge
+                was seen or `stop_at_cycle` is False).
+        """
+        graph = self.graph
+        finished = {}  # vertex -> False while on the stack, True once all descendants are done
+        postorder = []
+
+        for root in graph:
+            if root in finished:
+                continue
+            finished[root] = False
+            path = [root]
+            frames = [iter(graph[root])]
+            while frames:
+                for neighbor in frames[-1]:
+                    done = finished.get(neighbor)
+                    if done is None:
+                        finished[neighbor] = False
+                        path.append(neighbor)
+                        frames.append(iter(graph[neighbor]))
+                        break
+                    if not done and stop_at_cycle:
+                        return postorder, path[path.index(neighbor):] + [neighbor]
+                else:
+                    frames.pop()
+                    vertex = path.pop()
+                    finished[vertex] = True
+                    postorder.append(vertex)
+
+        return postorder, None
+
+    def _has_cycle_recursive(self):
+        # DFS finds a cycle exactly when it meets an edge back into the current path
+        return self._find_cycle() is not None
+
+    def _has_cycle_iterative(self) -> bool:
+        try:
+            self._topological_order()
+            return False
+        except ValueError:
+            return True
+
+    def _topological_sort_recursive(self):
+        # Every vertex finishes after all of its descendants, so reversed post-order is topological
+        postorder, _ = self._depth_first_search()
+        postorder.reverse()
+        return postorder
 
     def _topological_sort_iterative(self) -> List[int]:
         '''
@@ -109,14 +686,13 @@ class DAG:
         - Is generally easier to understand and debug
 
         The time complexity remains O(V + E) where V is the number of vertices and E is the number of edges.
+        On a frozen graph the same algorithm runs over the integer CSR buffers.
         '''
-        # Initialize tracking dictionaries
-        in_degree = {vertex: 0 for vertex in self.graph}
+        if self.frozen:
+            return self.graph.topological_sort()
 
-        # Calculate in-degrees of all vertices
-        for vertex in self.graph:
-            for neighbor in self.graph[vertex]:
-                in_degree[neighbor] += 1
+        # Start from a copy of the cached in-degree table
+        in_degree = dict(self._in_degree_table())
 
         # Collect all vertices with in-degree 0
         zero_in_degree = deque([v for v in self.graph if in_degree[v] == 0])
@@ -137,6 +713,99 @@ class DAG:
 
         return topological_order
 
+    def _kahn_order(self) -> Optional[List]:
+        try:
+            return self._topological_sort_iterative()
+        except ValueError:
+            return None
+
+    def _topological_order(self) -> List:
+        """
+        The topological order shared by all analyses: the maintained order, or the cached
+        result of Kahn's algorithm. Callers must not modify the returned list.
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        if self.maintain_order:
+            if self._removed:
+                self._compact_order()
+            return self._order
+        order = self._cached('topological_order', self._kahn_order)
+        if order is None:
+            raise ValueError("Graph has at least one cycle")
+        return order
+
+    def _in_degree_table(self) -> Dict:
+        if self.track_predecessors:
+            return self._in_degree
+
+        def count():
+            if self.frozen:
+                return dict(zip(self.graph.labels, self.graph.in_degree_ids()))
+            in_degree = {vertex: 0 for vertex in self.graph}
+            for neighbors in self.graph.values():
+                for neighbor in neighbors:
+                    in_degree[neighbor] += 1
+            return in_degree
+
+        return self._cached('in_degree', count)
+
+    def _predecessor_map(self) -> Dict:
+        """
+        The reverse adjacency: every vertex mapped to the list of its predecessors. The
+        maintained index when predecessors are tracked, otherwise built and cached.
+        """
+        if self.track_predecessors:
+            return self._predecessors
+
+        def build():
+            predecessors = {vertex: [] for vertex in self.graph}
+            for vertex in self.graph:
+                for neighbor in self.graph[vertex]:
+                    predecessors[neighbor].append(vertex)
+            return predecessors
+
+        return self._cached('predecessors', build)
+
+    def _topological_position(self) -> Dict:
+        """The cached position of every vertex in `_topological_order()`."""
+        return self._cached('topological_position',
+                            lambda: {vertex: i for i, vertex in enumerate(self._topological_order())})
+
+    def predecessors(self, vertex) -> List:
+        """Return the vertices with an edge into `vertex` (one entry per edge)."""
+        return list(self._predecessor_map()[vertex])
+
+    def in_degree(self, vertex) -> int:
+        """Return the number of edges into `vertex`; O(1) when predecessors are tracked."""
+        return self._in_degree_table()[vertex]
+
+    def ancestors(self, vertex) -> List:
+        """
+        Return every vertex with a path to `vertex`, in topological order.
+
+        Walks the predecessor index backwards from `vertex`, so the cost depends on the
+        number of ancestors rather than the size of the graph (plus a topological sort,
+        cached until the graph changes, unless the order is maintained).
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        predecessors = self._predecessor_map()
+        found = set()
+        stack = [vertex]
+        while stack:
+            for predecessor in predecessors[stack.pop()]:
+                if predecessor not in found:
+                    found.add(predecessor)
+                    stack.append(predecessor)
+        position = self._position if self.maintain_order else self._topological_position()
+        return sorted(found, key=position.__getitem__)
+
+    def _find_cycle(self) -> Optional[List]:
+        return self._cached('cycle', lambda: self._depth_first_search(stop_at_cycle=True)[1])
+
     def has_cycle(self, type: Literal['iterative', 'recursive'] = 'iterative') -> bool:
         if type == 'iterative':
             return self._has_cycle_iterative()
@@ -144,41 +813,513 @@ class DAG:
             return self._has_cycle_recursive()
 
     def topological_sort(self, type: Literal['iterative', 'recursive'] = 'iterative') -> List[int]:
-        if type == 'iterative':
-            return self._topological_sort_iterative()
+        """
+        Return the vertices in topological order.
+
+        The result is cached until the graph is modified, so repeated calls on an
+        unchanged graph only pay for copying the list.
+        """
+        if self.maintain_order or type == 'iterative':
+            return list(self._topological_order())
         else:
-            return self._topological_sort_recursive()
+            return list(self._cached('dfs_order', self._topological_sort_recursive))
 
-    def draw(self, filename='dag_graph.jpeg'):
-        import networkx as nx
-        import matplotlib.pyplot as plt
+    def in_degrees(self) -> Dict:
+        """Return a dictionary mapping every vertex to its number of incoming edges."""
+        return dict(self._in_degree_table())
+
+    def vertex_levels(self) -> Dict:
+        """
+        Return a dictionary mapping every vertex to its level: the number of edges on the
+        longest path reaching it from a source vertex. Vertices on the same level never
+        depend on each other.
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        return dict(self._levels())
+
+    def _levels(self) -> Dict:
+        return self._cached('levels', lambda: {
+            vertex: level for level, generation in enumerate(self._generations()) for vertex in generation
+        })
+
+    def _generations(self) -> List[List]:
+        """
+        Kahn's algorithm drained one wave at a time.
+
+        Each wave holds the vertices whose last incoming edge was removed by the previous
+        wave, which is exactly the set of vertices at the same level. Cached until the
+        graph is modified.
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        def compute():
+            graph = self.graph
+            in_degree = dict(self._in_degree_table())
+            generation = [vertex for vertex in graph if in_degree[vertex] == 0]
+            generations = []
+            seen = 0
+            while generation:
+                generations.append(generation)
+                seen += len(generation)
+                next_generation = []
+                for vertex in generation:
+                    for neighbor in graph[vertex]:
+                        in_degree[neighbor] -= 1
+                        if in_degree[neighbor] == 0:
+                            next_generation.append(neighbor)
+                generation = next_generation
+            return generations if seen == len(graph) else None
+
+        generations = self._cached('generations', compute)
+        if generations is None:
+            raise ValueError("Graph has at least one cycle")
+        return generations
+
+    def topological_levels(self) -> List[List]:
+        """
+        Group the vertices into levels of mutually independent vertices.
+
+        Level 0 holds the vertices without incoming edges and level `k` the vertices whose
+        longest incoming path has `k` edges, so running the levels one after another, with
+        every level in parallel, respects all dependencies.
+
+        Returns:
+            List[List]: The vertices of each level, in level order.
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        return [list(generation) for generation in self._generations()]
+
+    def generations(self) -> Iterator[List]:
+        """Iterate over the levels of `topological_levels()` one batch at a time."""
+        for generation in self._generations():
+            yield list(generation)
+
+    def depth(self) -> int:
+        """The number of levels, i.e. the number of vertices on the longest path."""
+        return len(self._generations())
+
+    def width(self) -> int:
+        """The size of the largest level: how many vertices can ever run at the same time."""
+        return max(map(len, self._generations()), default=0)
+
+    def _csr(self) -> CSRAdjacency:
+        """The graph in CSR form: the storage itself when frozen, otherwise a cached copy."""
+        if self.frozen:
+            return self.graph
+        return self._cached('csr', lambda: CSRAdjacency.from_dict(self.graph))
+
+    def path_lengths(self, sources=None, mode: Literal['longest', 'shortest'] = 'longest',
+                     default_vertex_weight: float = 0, default_edge_weight: float = 1) -> Tuple[Dict, Dict]:
+        """
+        Compute longest or shortest path lengths by relaxing edges in topological order.
+
+        The length of a path is the sum of the weights of its vertices (both endpoints
+        included) and of its edges. Weights come from `vertex_weights` / `edge_weights`
+        (set through the `weight` arguments of `add_vertex` / `add_edge`); missing ones
+        use the defaults, so an unweighted graph measures paths in edges.
+
+        Args:
+            sources: A start vertex, an iterable of start vertices, or None to let every
+                vertex start a path.
+            mode: Whether to maximize or minimize the path length.
+            default_vertex_weight: Weight of vertices without an entry in `vertex_weights`.
+            default_edge_weight: Weight of edges without an entry in `edge_weights`.
+
+        Returns:
+            tuple: A dictionary mapping every vertex reachable from the sources to its
+                best path length, and a dictionary mapping each of those vertices to its
+                predecessor on that path (see `path_to`).
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        graph = self.graph
+        vertex_weights, edge_weights = self.vertex_weights, self.edge_weights
+        if sources is None:
+            sources = graph
+        elif ((isinstance(sources, Hashable) and sources in graph)
+              or isinstance(sources, (str, bytes)) or not isinstance(sources, Iterable)):
+            sources = [sources]
+        distance = {}
+        for source in sources:
+            if source not in graph:
+                raise KeyError(f"Vertex {source!r} not found in graph")
+            distance[source] = vertex_weights.get(source, default_vertex_weight)
+        predecessor = {}
+        longest = mode == 'longest'
+
+        for vertex in self._topological_order():
+            if vertex not in distance:
+                continue
+            length = distance[vertex]
+            for neighbor in graph[vertex]:
+                candidate = (length + edge_weights.get((vertex, neighbor), default_edge_weight)
+                             + vertex_weights.get(neighbor, default_vertex_weight))
+                current = distance.get(neighbor)
+                if current is None or (candidate > current if longest else candidate < current):
+                    distance[neighbor] = candidate
+                    predecessor[neighbor] = vertex
+
+        return distance, predecessor
+
+    def critical_path(self, default_vertex_weight: float = 1, default_edge_weight: float = 0) -> Tuple[float, List]:
+        """
+        Find the most expensive path through the graph.
+
+        With vertex weights as job costs this is the minimum makespan of the graph on
+        unlimited workers. The defaults here count vertex costs only, so an unweighted
+        graph returns its longest chain measured in vertices.
 
+        Returns:
+            tuple: The length of the critical path and its vertices.
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        distance, predecessor = self.path_lengths(
+            mode='longest', default_vertex_weight=default_vertex_weight, default_edge_weight=default_edge_weight)
+        if not distance:
+            return 0, []
+        end = max(distance, key=distance.__getitem__)
+        return distance[end], self.path_to(predecessor, end)
+
+    def path_to(self, predecessors, target) -> List:
+        """
+        Rebuild the path ending at `target` from a predecessor table.
+
+        Args:
+            predecessors: The predecessor dictionary from `path_lengths`, or one row of the
+                predecessor array from `batched_path_lengths`.
+            target: The last vertex of the path.
+        """
+        if isinstance(predecessors, dict):
+            path = [target]
+            while path[-1] in predecessors:
+                path.append(predecessors[path[-1]])
+        else:
+            csr = self._csr()
+            ids = [csr.index[target]]
+            while predecessors[ids[-1]] >= 0:
+                ids.append(int(predecessors[ids[-1]]))
+            path = [csr.labels[i] for i in ids]
+        path.reverse()
+        return path
+
+    def batched_path_lengths(self, sources, mode: Literal['longest', 'shortest'] = 'longest',
+                             default_vertex_weight: float = 0, default_edge_weight: float = 1):
+        """
+        `path_lengths` for many single sources at once, vectorized with NumPy.
+
+        Vertices are relaxed in topological order over the CSR form of the graph, and every
+        relaxation updates all sources together as one column operation.
+
+        Args:
+            sources: The start vertices; row `i` of the result belongs to `sources[i]`.
+            mode, default_vertex_weight, default_edge_weight: As in `path_lengths`.
+
+        Returns:
+            tuple: The vertices labelling the columns, a float array of shape
+                `(len(sources), V)` with the path lengths (-inf / inf where a vertex is not
+                reachable), and an integer array of the same shape with the column of each
+                vertex's predecessor (-1 for none). Pass a predecessor row to `path_to`.
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        import numpy as np
+
+        csr = self._csr()
+        order = [csr.index[vertex] for vertex in self._topological_order()]
+        labels, offsets = csr.labels, csr.offsets
+        targets = np.asarray(memoryview(csr.targets), dtype=np.intp)
+
+        vertex_weight = np.array([self.vertex_weights.get(vertex, default_vertex_weight) for vertex in labels],
+                                 dtype=float)
+        if self.edge_weights:
+            edge_weight = np.array([self.edge_weights.get((labels[i], labels[t]), default_edge_weight)
+                                    for i in range(len(labels))
+                                    for t in targets[offsets[i]:offsets[i + 1]].tolist()], dtype=float)
+        else:
+            edge_weight = np.full(len(targets), default_edge_weight, dtype=float)
+
+        source_ids = np.array([csr.index[source] for source in sources], dtype=np.intp)
+        longest = mode == 'longest'
+        rows = np.arange(len(source_ids))
+        distance = np.full((len(source_ids), len(labels)), -np.inf if longest else np.inf)
+        distance[rows, source_ids] = vertex_weight[source_ids]
+        predecessor = np.full(distance.shape, -1, dtype=np.intp)
+
+        for vertex in order:
+            start, end = offsets[vertex], offsets[vertex + 1]
+            if start == end:
+                continue
+            neighbors = targets[start:end]
+            candidate = distance[:, vertex, None] + (edge_weight[start:end] + vertex_weight[neighbors])
+            current = distance[:, neighbors]
+            better = candidate > current if longest else candidate < current
+            if better.any():
+                distance[:, neighbors] = np.where(better, candidate, current)
+                predecessor[:, neighbors] = np.where(better, vertex, predecessor[:, neighbors])
+
+        return list(labels), distance, predecessor
+
+    def _reachability(self) -> Tuple[List, Dict, Dict]:
+        """
+        Build the descendant bitset of every vertex.
+
+        Vertices are numbered by their position in the topological order, and the
+        descendants of a vertex are stored as a Python integer with one bit per
+        descendant. Walking the order backwards, each vertex ORs together the bitsets
+        of its successors plus the successors themselves, so every edge is processed
+        once with word-level big-integer operations. The index takes V^2 / 8 bytes.
+
+        Returns:
+            tuple: The topological order, a dictionary mapping vertices to their bit
+                position, and a dictionary mapping vertices to their descendant bitsets.
+        """
+        def build():
+            graph = self.graph
+            order = self._topological_order()
+            position = {vertex: i for i, vertex in enumerate(order)}
+            descendants = {}
+            for vertex in reversed(order):
+                bits = 0
+                for neighbor in graph[vertex]:
+                    bits |= descendants[neighbor] | (1 << position[neighbor])
+                descendants[vertex] = bits
+            return order, position, descendants
+
+        return self._cached('reachability', build)
+
+    def reaches(self, from_vertex, to_vertex) -> bool:
+        """
+        Check whether there is a path of one or more edges from `from_vertex` to `to_vertex`.
+
+        The first call builds a reachability index (see `descendants`), which is cached
+        until the graph is modified; later calls are a single bit test.
+        """
+        _, position, descendants = self._reachability()
+        return bool(descendants[from_vertex] >> position[to_vertex] & 1)
+
+    def descendants(self, vertex) -> List:
+        """
+        Return every vertex reachable from `vertex`, in topological order.
+
+        Answered from the cached reachability index without traversing the graph.
+
+        Raises:
+            ValueError: If the graph has at least one cycle.
+        """
+        order, _, descendants = self._reachability()
+        return _decode_bits(descendants[vertex], order)
+
+    def transitive_closure(self) -> 'DAG':
+        """
+        Return a new DAG with an edge from every vertex to each of its descendants.
+        """
+        order, _, descendants = self._reachability()
+        closure = DAG()
+        closure.graph = {vertex: _decode_bits(descendants[vertex], order) for vertex in self.graph}
+        return closure
+
+    def transitive_reduction(self) -> 'DAG':
+        """
+        Return a new DAG with the fewest edges that preserves reachability.
+
+        An edge `u -> v` is dropped when `v` is also reachable through another successor of
+        `u`. Visiting the successors of `u` in topological order, each kept successor adds
+        its descendant bitset to the set of covered vertices, and a successor that is
+        already covered is redundant. Parallel edges are collapsed as well.
+        """
+        _, position, descendants = self._reachability()
+        reduction = DAG()
+        for vertex, neighbors in self.graph.items():
+            unique = list(dict.fromkeys(neighbors))
+            covered = 0
+            kept = set()
+            for neighbor in sorted(unique, key=position.__getitem__):
+                if not covered >> position[neighbor] & 1:
+                    kept.add(neighbor)
+                    covered |= descendants[neighbor]
+            reduction.graph[vertex] = [neighbor for neighbor in unique if neighbor in kept]
+        return reduction
+
+    def find_cycle(self) -> Optional[List]:
+        """
+        Find a cycle in the graph.
+
+        Returns:
+            The vertices along one cycle, starting and ending with the same vertex
+            (e.g. `['A', 'B', 'C', 'A']`), or None if the graph is acyclic.
+        """
+        cycle = self._find_cycle()
+        return list(cycle) if cycle is not None else None
+
+    def strongly_connected_components(self) -> List[List]:
+        """
+        Compute the strongly connected components with an iterative Tarjan's algorithm.
+
+        Every vertex of a DAG is its own component; any component with more than one
+        vertex is a group of vertices that all lie on common cycles.
+
+        Returns:
+            List[List]: The components, each a list of vertices. Components are emitted in
+                reverse topological order of the condensation: a component never has an edge
+                into a component that comes after it.
+        """
+        graph = self.graph
+        index = {}  # vertex -> discovery index
+        lowlink = {}  # vertex -> smallest discovery index reachable from its DFS subtree
+        on_stack = set()
+        component_stack = []
+        components = []
+
+        for root in graph:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            component_stack.append(root)
+            on_stack.add(root)
+            frames = [(root, iter(graph[root]))]
+            while frames:
+                vertex, neighbors = frames[-1]
+                for neighbor in neighbors:
+                    if neighbor not in index:
+                        index[neighbor] = lowlink[neighbor] = len(index)
+                        component_stack.append(neighbor)
+                        on_stack.add(neighbor)
+                        frames.append((neighbor, iter(graph[neighbor])))
+                        break
+                    if neighbor in on_stack and index[neighbor] < lowlink[vertex]:
+                        lowlink[vertex] = index[neighbor]
+                else:
+                    frames.pop()
+                    if frames:
+                        parent = frames[-1][0]
+                        if lowlink[vertex] < lowlink[parent]:
+                            lowlink[parent] = lowlink[vertex]
+                    if lowlink[vertex] == index[vertex]:
+                        # vertex is the root of a component: pop its members
+                        component = []
+                        while True:
+                            member = component_stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == vertex:
+                                break
+                        components.append(component)
+
+        return components
+
+    def condensation(self) -> Tuple['DAG', List[List]]:
+        """
+        Contract every strongly connected component into a single vertex.
+
+        Returns:
+            tuple: A `DAG` whose vertices are the component numbers `0..k-1`, numbered in
+                topological order, and the list of components so that `components[i]`
+                holds the original vertices merged into vertex `i`. Parallel edges
+                between two components are collapsed into one.
+        """
+        components = self.strongly_connected_components()
+        components.reverse()
+        membership = {vertex: i for i, component in enumerate(components) for vertex in component}
+
+        condensed = DAG()
+        for i in range(len(components)):
+            condensed.add_vertex(i)
+        for i, component in enumerate(components):
+            targets = {membership[neighbor] for vertex in component for neighbor in self.graph[vertex]}
+            targets.discard(i)
+            condensed.graph[i].extend(sorted(targets))
+
+        return condensed, components
+
+    def export(self, path, format: Optional[Literal['dot', 'graphml', 'json']] = None):
+        """
+        Stream the graph to a DOT, GraphML or JSON edge-list file.
+
+        The writers in `export` walk the adjacency directly and write in chunks, so no
+        copy of the graph is built. The format follows the extension of `path` (`.dot`
+        or `.gv`, `.graphml`, `.json`) unless `format` is given.
+        """
+        export_graph(self, path, format)
+
+    def layered_layout(self, sweeps: int = 4, max_width: Optional[int] = None) -> Layout:
+        """
+        Compute a layered drawing of the graph: levels from `topological_levels`,
+        crossings reduced by barycenter sweeps, and levels wider than `max_width`
+        collapsed into groups. See `layout.layered_layout`.
+
+        Raises:
+            ValueError: If the graph has at least one cycle, or `max_width` is less than 1.
+        """
+        return layered_layout(self, sweeps=sweeps, max_width=max_width)
+
+    def draw(self, filename='dag_graph.jpeg', layout: Literal['layered', 'spring'] = 'layered',
+             max_width: Optional[int] = 100, sweeps: int = 4):
         """
         Draws the DAG and saves it as a JPEG image.
 
         Args:
             filename: The name of the file where the image will be saved.
+            layout: 'layered' draws the levels of `layered_layout` top to bottom with
+                matplotlib alone, so it scales to large graphs; edges point downwards.
+                'spring' uses networkx's force-directed layout, which costs O(V^2) per
+                iteration and is only practical for small graphs.
+            max_width: For the layered layout, the maximum number of nodes per level;
+                wider levels are collapsed into groups drawn with their size.
+            sweeps: For the layered layout, the number of crossing-reduction sweeps.
+        """
+        import matplotlib.pyplot as plt
 
-        This function creates a networkx DiGraph from the internal graph representation
-        and uses matplotlib to save it as a JPEG image.
-        """
-        G = nx.DiGraph(self.graph)
-        pos = nx.spring_layout(G)  # positions for all nodes
-        nx.draw(
-            G,
-            pos,
-            with_labels=True,
-            node_size=500,
-            node_color='lightblue',
-            font_size=10,
-            font_weight='bold',
-            arrowsize=10,
-        )
+        if layout == 'spring':
+            import networkx as nx
+
+            G = nx.DiGraph(self.graph)
+            pos = nx.spring_layout(G)  # positions for all nodes
+            nx.draw(
+                G,
+                pos,
+                with_labels=True,
+                node_size=500,
+                node_color='lightblue',
+                font_size=10,
+                font_weight='bold',
+                arrowsize=10,
+            )
+        elif layout == 'layered':
+            from matplotlib.collections import LineCollection
+
+            drawing = self.layered_layout(sweeps=sweeps, max_width=max_width)
+            positions = drawing.positions
+            width = max(map(len, drawing.layers), default=1)
+            figure, axes = plt.subplots(figsize=(min(4 + width * 0.4, 60), min(3 + len(drawing.layers) * 0.6, 60)))
+            axes.add_collection(LineCollection(
+                [(positions[from_node], positions[to_node]) for from_node, to_node in drawing.edges],
+                colors='gray', linewidths=0.5, alpha=0.6, zorder=1))
+            nodes = list(positions)
+            axes.scatter([positions[node][0] for node in nodes], [positions[node][1] for node in nodes],
+                         s=[60 + 20 * len(node) ** 0.5 if isinstance(node, Group) else 60 for node in nodes],
+                         c=['orange' if isinstance(node, Group) else 'lightblue' for node in nodes],
+                         edgecolors='black', linewidths=0.5, zorder=2)
+            if len(nodes) <= 500:
+                for node in nodes:
+                    label = f'{len(node)}' if isinstance(node, Group) else str(node)
+                    axes.annotate(label, positions[node], ha='center', va='center', fontsize=6, zorder=3)
+            axes.autoscale()
+            axes.axis('off')
+        else:
+            raise ValueError(f"Unknown layout {layout!r}; expected 'layered' or 'spring'")
         plt.title("Directed Acyclic Graph (DAG)")
         plt.savefig(filename, format='jpeg')
         plt.close()
 
-
 if __name__ == '__main__':
     # Create a new DAG instance
     dag = DAG()
@@ -187,14 +1328,13 @@ if __name__ == '__main__':
     vertices = [f'V{i}' for i in range(num_vertices)]
 
     # Randomly add edges to form a DAG
-    for i in range(num_vertices):
-        from_vertex = vertices[i]
-        # Ensure we only add edges to vertices with a higher index to maintain acyclic property
-        for j in range(i + 1, num_vertices):
-            to_vertex = vertices[j]
-            # Randomly decide whether to add an edge
-            if random.choice([True, False]):
-                dag.add_edge(from_vertex, to_vertex)
+    # Ensure we only add edges to vertices with a higher index to maintain acyclic property
+    dag.add_edges_from(
+        (vertices[i], vertices[j])
+        for i in range(num_vertices)
+        for j in range(i + 1, num_vertices)
+        if random.choice([True, False])  # Randomly decide whether to add an edge
+    )
 
     assert not dag.has_cycle()
 
@@ -1,44 +1,1190 @@
+import asyncio
+import inspect
+import pickle
+import queue
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import resource_tracker, shared_memory
+from typing import Literal, Optional
+
 from dag import DAG
+from memo import MISSING, DiskCache, ResultCache, fingerprint, operation_fingerprint
+from profiling import Profiler
+from stores import ResultStore
+
+# NumPy arrays and bytes of at least this many bytes travel between processes through shared memory
+SHARED_MEMORY_THRESHOLD = 1 << 20
+
+# How often (in seconds) streaming stages blocked on a queue check whether the stream was stopped
+STREAM_POLL_INTERVAL = 0.05
+
+_END_OF_STREAM = object()
+
+
+class _SharedValue:
+    """A picklable handle to a bytes object or NumPy array copied into a shared memory block"""
+
+    __slots__ = ('name', 'kind', 'size', 'shape', 'dtype')
+
+    def __init__(self, name, kind, size, shape=None, dtype=None):
+        self.name = name
+        self.kind = kind
+        self.size = size
+        self.shape = shape
+        self.dtype = dtype
+
+    def __getstate__(self):
+        return self.name, self.kind, self.size, self.shape, self.dtype
+
+    def __setstate__(self, state):
+        self.name, self.kind, self.size, self.shape, self.dtype = state
+
+
+def _to_shared(value, threshold):
+    """
+    Copy a large value into a new shared memory block.
+
+    Returns:
+        tuple: The value to send (a `_SharedValue` handle, or `value` itself when it is
+            small or of another type) and the block the caller must release (or None).
+    """
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.ndarray) and value.dtype.kind != 'O' \
+            and value.nbytes >= threshold:
+        block = shared_memory.SharedMemory(create=True, size=max(value.nbytes, 1))
+        numpy.ndarray(value.shape, value.dtype, buffer=block.buf)[...] = value
+        return _SharedValue(block.name, 'ndarray', value.nbytes, value.shape, value.dtype.str), block
+    if isinstance(value, (bytes, bytearray)) and len(value) >= threshold:
+        block = shared_memory.SharedMemory(create=True, size=max(len(value), 1))
+        block.buf[:len(value)] = value
+        return _SharedValue(block.name, type(value).__name__, len(value)), block
+    return value, None
+
+
+def _disown(block):
+    """
+    Stop this worker's resource tracker from unlinking a block it created; the parent
+    process takes it over and unlinks it after copying the value out.
+    """
+    resource_tracker.unregister(block._name, 'shared_memory')
+
+
+def _from_shared(value, unlink):
+    """Copy the value behind a `_SharedValue` handle out of shared memory; other values pass through."""
+    if not isinstance(value, _SharedValue):
+        return value
+    block = shared_memory.SharedMemory(name=value.name)
+    try:
+        if value.kind == 'ndarray':
+            import numpy
+            return numpy.ndarray(value.shape, numpy.dtype(value.dtype), buffer=block.buf).copy()
+        data = bytes(block.buf[:value.size])
+        return bytearray(data) if value.kind == 'bytearray' else data
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _discard_shared(value):
+    if isinstance(value, _SharedValue):
+        _release(shared_memory.SharedMemory(name=value.name))
+
+
+def _release(block):
+    block.close()
+    block.unlink()
+
+
+def _run_chain(operations, value):
+    """Run a chain of operations, each on the previous result; return every result"""
+    results = []
+    for operation in operations:
+        value = operation(value)
+        results.append(value)
+    return results
+
+
+def _run_chain_in_worker(operations, value, threshold):
+    """`_run_chain` inside a worker process; large values cross the process boundary via shared memory"""
+    results = _run_chain(operations, _from_shared(value, unlink=False))
+    shared = []
+    for result in results:
+        handle, block = _to_shared(result, threshold)
+        if block is not None:
+            _disown(block)
+            block.close()
+        shared.append(handle)
+    return shared
+
+
+def _is_picklable(operation):
+    try:
+        pickle.dumps(operation)
+        return True
+    except Exception:
+        return False
+
+
+def _release_schedule(sources, keep):
+    """
+    For each step of a run where step `j` consumes the value of step `sources[j]`, the
+    steps whose values can be dropped once it has run: every value not in `keep` is
+    dropped after its last consumer, or right away if nothing consumes it.
+    """
+    last_use = list(range(len(sources)))
+    for j in range(1, len(sources)):
+        last_use[sources[j]] = j
+    schedule = [[] for _ in sources]
+    for i, j in enumerate(last_use):
+        if i not in keep:
+            schedule[j].append(i)
+    return tuple(map(tuple, schedule))
+
+
+def _run_steps(operations, sources, release, input_data):
+    """Run steps in order, each on the value of its source step, dropping values per the release schedule"""
+    values = [None] * len(operations)
+    for i, operation in enumerate(operations):
+        values[i] = operation(values[sources[i]] if i else input_data)
+        for k in release[i]:
+            values[k] = None
+    return values
+
+
+class _Composed:
+    """
+    A chain of operations called as one, `operations[-1](...(operations[0](x)))`.
+
+    A class rather than a closure, so a composition of picklable operations can be
+    pickled too.
+    """
+
+    __slots__ = ('operations',)
+
+    def __init__(self, operations):
+        self.operations = tuple(operations)
+
+    def __call__(self, value):
+        for operation in self.operations:
+            value = operation(value)
+        return value
+
+    def __repr__(self):
+        return f'{type(self).__name__}({list(self.operations)!r})'
+
+
+def _compose(operations):
+    """Compose a chain of operations into one callable; a single operation is returned as is."""
+    if len(operations) == 1:
+        return operations[0]
+    return _Composed(operations)
+
+
+class _StreamStopped(BaseException):
+    """Unwinds a streaming stage after another stage failed or the consumer stopped reading"""
+
+
+def _stream_put(channel, item, stop):
+    while True:
+        if stop.is_set():
+            raise _StreamStopped
+        try:
+            channel.put(item, timeout=STREAM_POLL_INTERVAL)
+            return
+        except queue.Full:
+            pass
+
+
+def _stream_items(channel, stop):
+    """Yield the items of a stage's input queue until the end-of-stream marker"""
+    while True:
+        if stop.is_set():
+            raise _StreamStopped
+        try:
+            item = channel.get(timeout=STREAM_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        if item is _END_OF_STREAM:
+            return
+        yield item
+
+
+class ExecutionPlan:
+    """
+    A reusable run of a `DataFlowGraph` from one start node, built by `DataFlowGraph.compile`.
+
+    The nodes reachable from the start node are laid out in topological order (the start
+    node first) and everything a run needs is resolved into flat tuples indexed by that
+    position, so running the plan needs no sorting and no dictionary lookups per node.
+
+    Attributes:
+        nodes: The reachable nodes in execution order.
+        operations: The operation of each node.
+        sources: For each node, the position of the predecessor whose result it receives
+            (the last one in topological order), or -1 for the start node.
+        fanout: For each node, the positions of its successors (one entry per edge).
+        in_degree: For each node, the number of edges into it from reachable nodes.
+        consumers: For each node, the number of nodes that receive its result.
+        sinks: The positions of the nodes without successors.
+    """
+
+    def __init__(self, dfg: 'DataFlowGraph', start_node):
+        self.dfg = dfg
+        self.start_node = start_node
+        self.version = dfg._plan_version()
+
+        graph = dfg.graph
+        reachable = {start_node}
+        stack = [start_node]
+        while stack:
+            for neighbor in graph[stack.pop()]:
+                if neighbor not in reachable:
+                    reachable.add(neighbor)
+                    stack.append(neighbor)
+        if len(reachable) == len(graph):
+            nodes = list(dfg._topological_order())
+        else:
+            nodes = [node for node in dfg._topological_order() if node in reachable]
+
+        position = self.position = {node: i for i, node in enumerate(nodes)}
+        sources = [-1] * len(nodes)
+        in_degree = [0] * len(nodes)
+        fanout = []
+        for i, node in enumerate(nodes):
+            successors = tuple(position[neighbor] for neighbor in graph[node])
+            for j in successors:
+                sources[j] = i
+                in_degree[j] += 1
+            fanout.append(successors)
+
+        self.nodes = tuple(nodes)
+        self.operations = tuple(dfg.node_operations[node] for node in nodes)
+        self.sources = tuple(sources)
+        self.fanout = tuple(fanout)
+        self.in_degree = tuple(in_degree)
+        consumers = [0] * len(nodes)
+        for source in sources[1:]:
+            consumers[source] += 1
+        self.consumers = tuple(consumers)
+        self.sinks = frozenset(i for i, successors in enumerate(fanout) if not successors)
+        self.coroutine_nodes = [node for node in nodes if node in dfg._coroutine_nodes]
+        self.pure = tuple(node not in dfg._impure_nodes for node in nodes)
+        self.streaming = tuple(node in dfg._streaming_nodes for node in nodes)
+        self._picklable = None
+        self._operation_fingerprints = None
+        self._release_schedules = {}
+        self._fused = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(start_node={self.start_node!r}, nodes={len(self.nodes)})'
+
+    @property
+    def stale(self) -> bool:
+        """Whether the graph or its operations changed since the plan was compiled."""
+        return self.version != self.dfg._plan_version()
+
+    @property
+    def picklable(self):
+        """For each node, whether its operation can be sent to a worker process."""
+        if self._picklable is None:
+            self._picklable = tuple(_is_picklable(operation) for operation in self.operations)
+        return self._picklable
+
+    @property
+    def operation_fingerprints(self):
+        """For each node, the `memo.operation_fingerprint` of its operation and version."""
+        if self._operation_fingerprints is None:
+            versions = self.dfg._operation_versions
+            self._operation_fingerprints = tuple(operation_fingerprint(operation, versions.get(node))
+                                                 for node, operation in zip(self.nodes, self.operations))
+        return self._operation_fingerprints
+
+    def select(self, outputs):
+        """
+        Resolve an `outputs` argument of `DataFlowGraph.process_data` to plan positions.
+
+        Returns:
+            frozenset: The positions of the results to return, or None for all of them.
+
+        Raises:
+            ValueError: If a requested node is not reachable from the start node.
+        """
+        if outputs is None:
+            return None
+        if isinstance(outputs, str) and outputs == 'sinks':
+            return self.sinks
+        keep = set()
+        for node in outputs:
+            if node not in self.position:
+                raise ValueError(f"Node {node!r} is not reachable from start node {self.start_node!r}")
+            keep.add(self.position[node])
+        return frozenset(keep)
+
+    def release_schedule(self, keep):
+        """
+        For each position, the positions whose results can be dropped once it has run.
+
+        A result is dropped right after its last consumer has run, or right after it is
+        computed if nothing consumes it, unless its position is in `keep`.
+        """
+        schedule = self._release_schedules.get(keep)
+        if schedule is None:
+            schedule = self._release_schedules[keep] = _release_schedule(self.sources, keep)
+        return schedule
+
+    def fused(self, keep, key=None):
+        """
+        The plan with every linear chain fused into a single step, for runs that return
+        only the results at the positions in `keep`.
+
+        A chain (see `chains`, which also explains `key`) is cut after every position in
+        `keep`, so requested results stay available; the operations of each chain are
+        composed into one callable. Running the fused steps skips the per-node stores
+        and releases.
+
+        Returns:
+            tuple: The chains of positions, the composed operation of each chain, the
+                chain each one receives its input from (-1 for the first), and the
+                release schedule of the chains.
+        """
+        fused = self._fused.get((keep, key))
+        if fused is None:
+            chains = self.chains(key, keep)
+            chain_of = {}
+            for k, chain in enumerate(chains):
+                chain_of[chain[-1]] = k
+            # A chain's first node receives the last node of its source's chain
+            sources = tuple(chain_of[self.sources[chain[0]]] if chain[0] else -1 for chain in chains)
+            kept = frozenset(k for k, chain in enumerate(chains) if chain[-1] in keep)
+            operations = tuple(_compose([self.operations[i] for i in chain]) for chain in chains)
+            fused = self._fused[keep, key] = (chains, operations, sources, _release_schedule(sources, kept))
+        return fused
+
+    def run(self, input_data, outputs=None, store: Optional[ResultStore] = None):
+        """
+        Run the plan sequentially.
+
+        Args:
+            input_data: The input of the start node's operation.
+            outputs: The results to return, as for `DataFlowGraph.process_data`.
+            store: Where to keep results during the run, as for `DataFlowGraph.process_data`.
+
+        Returns:
+            dict: The requested results, as `DataFlowGraph.process_data` returns them.
+
+        Raises:
+            RuntimeError: If the graph changed since the plan was compiled.
+        """
+        if self.stale:
+            raise RuntimeError("Execution plan is stale; compile the graph again")
+        if self.coroutine_nodes:
+            raise TypeError(f"Operation for node {self.coroutine_nodes[0]!r} is a coroutine function; "
+                            f"use process_data_async")
+
+        return self._execute(input_data, self.select(outputs), self.operations, store)
+
+    __call__ = run
+
+    def _execute(self, input_data, keep, operations, store=None):
+        """`run` with the given operations in place of the plan's (e.g. instrumented ones)"""
+        if store is not None:
+            return self._run_stored(input_data, keep, operations, store)
+        if self.dfg.memo is not None or self.dfg.disk_cache is not None:
+            return self._run_memoized(input_data, keep, operations)
+
+        sources = self.sources
+        if keep is None:
+            values = [operations[0](input_data)]
+            append = values.append
+            for i in range(1, len(operations)):
+                append(operations[i](values[sources[i]]))
+            return dict(zip(self.nodes, values))
+
+        if operations is self.operations:
+            # Only the kept results are needed, so every linear chain runs as one call
+            chains, operations, sources, release = self.fused(keep)
+            values = _run_steps(operations, sources, release, input_data)
+            return {self.nodes[chain[-1]]: values[i] for i, chain in enumerate(chains) if chain[-1] in keep}
+
+        # Instrumented operations stay separate so that each node is measured
+        values = _run_steps(operations, sources, self.release_schedule(keep), input_data)
+        return self.collect(values, keep)
+
+    def _run_stored(self, input_data, keep, operations, store):
+        """`run` with every result kept in `store` instead of a list"""
+        nodes, sources = self.nodes, self.sources
+        release = self.release_schedule(keep) if keep is not None else None
+        for i, operation in enumerate(operations):
+            store.put(nodes[i], operation(store.get(nodes[sources[i]]) if i else input_data))
+            if release is not None:
+                for k in release[i]:
+                    store.discard(nodes[k])
+        kept = range(len(nodes)) if keep is None else sorted(keep)
+        return {nodes[i]: store.get(nodes[i]) for i in kept}
+
+    def consume(self, values, remaining, keep, i):
+        """
+        Count one consumer of position `i` as served, for executors that run nodes out of
+        plan order. `remaining` starts as a copy of `consumers`; the value of `i` is
+        dropped after its last consumer unless `keep` is None or contains `i`.
+        """
+        remaining[i] -= 1
+        if not remaining[i] and keep is not None and i not in keep:
+            values[i] = None
+
+    def collect(self, values, keep):
+        """Map the kept positions (all when `keep` is None) of a list of per-position values to their nodes"""
+        if keep is None:
+            return dict(zip(self.nodes, values))
+        return {self.nodes[i]: values[i] for i in sorted(keep)}
+
+    def _run_memoized(self, input_data, keep, operations):
+        """
+        `run`, reusing the cached result of every pure node whose input fingerprint is
+        unchanged: from the in-memory cache first, then from the disk cache
+        """
+        memo, disk_cache = self.dfg.memo, self.dfg.disk_cache
+        nodes, sources, fanout, pure = self.nodes, self.sources, self.fanout, self.pure
+        operation_fingerprints = self.operation_fingerprints if disk_cache is not None else None
+        release = self.release_schedule(keep) if keep is not None else None
+        values = [None] * len(operations)
+        fingerprints = [None] * len(operations)
+        for i in range(len(operations)):
+            if i == 0:
+                value, input_fingerprint = input_data, fingerprint(input_data)
+            else:
+                value, input_fingerprint = values[sources[i]], fingerprints[sources[i]]
+            cacheable = pure[i] and input_fingerprint is not None
+            entry = MISSING
+            if cacheable and memo is not None:
+                entry = memo.get((nodes[i], input_fingerprint))
+            disk_key = None
+            if (entry is MISSING and cacheable and disk_cache is not None
+                    and operation_fingerprints[i] is not None):
+                disk_key = operation_fingerprints[i] + input_fingerprint
+                entry = disk_cache.get(disk_key)
+                if entry is not MISSING and memo is not None:
+                    memo.put((nodes[i], input_fingerprint), *entry)
+            if entry is not MISSING:
+                values[i], fingerprints[i] = entry
+            else:
+                result = operations[i](value)
+                result_fingerprint = fingerprint(result) if cacheable or fanout[i] else None
+                if cacheable and memo is not None:
+                    memo.put((nodes[i], input_fingerprint), result, result_fingerprint)
+                if disk_key is not None:
+                    disk_cache.put(disk_key, result, result_fingerprint)
+                values[i], fingerprints[i] = result, result_fingerprint
+            if release is not None:
+                for k in release[i]:
+                    values[k] = None
+        return self.collect(values, keep)
+
+    def chains(self, key=None, keep=None):
+        """
+        Split the plan into maximal linear chains of positions.
+
+        A node continues the chain of its predecessor when that predecessor has no other
+        successor and the node has no other predecessor (and both have the same `key`, if
+        given, and the predecessor is not in `keep`, if given). Only the first node of a
+        chain ever waits for other nodes.
+        """
+        chains = []
+        chain_of = [None] * len(self.nodes)
+        for i in range(len(self.nodes)):
+            previous = self.sources[i]
+            if (self.in_degree[i] == 1 and len(self.fanout[previous]) == 1
+                    and (key is None or key[previous] == key[i])
+                    and (keep is None or previous not in keep)):
+                chain = chain_of[i] = chain_of[previous]
+                chain.append(i)
+            else:
+                chain = chain_of[i] = [i]
+                chains.append(chain)
+        return chains
 
 
 class DataFlowGraph(DAG):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
         self.node_operations = {}  # Store operation for each node
+        self._coroutine_nodes = set()  # Nodes whose operation is a coroutine function
+        self.batch_operations = {}  # Operations that process a whole batch at once
+        self._operations_version = 0  # Bumped whenever an operation is (re)assigned
+        self._impure_nodes = set()  # Nodes whose results must never be reused
+        self._streaming_nodes = set()  # Nodes whose operation maps an iterator of items to an iterable
+        self.memo = None  # ResultCache of node results, see enable_memoization
+        self.disk_cache = None  # DiskCache of node results, see enable_disk_cache
+        self._operation_versions = {}  # Versions that distinguish operations in the disk cache
+        self._pools = {}  # (executor, max_workers) -> pool kept for later runs, see close
+        self._pools_lock = threading.Lock()
         
-    def add_operation(self, node_id, operation):
-        """Add a node with its associated operation"""
+    def add_operation(self, node_id, operation, vectorized=False, pure=True, streaming=False, version=None):
+        """
+        Add a node with its associated operation
+
+        Args:
+            node_id: The node.
+            operation: A callable applied to one input value.
+            vectorized: How `process_batch` runs the node. True means `operation` itself
+                works on a whole batch (e.g. `lambda x: x * 2` on a NumPy array); a callable
+                is used as the batch version of `operation`. When False, `process_batch`
+                calls `operation` once per item.
+            pure: Whether `operation` always returns the same result for the same input and
+                has no side effects. With memoization enabled, the results of impure nodes
+                are never reused.
+            streaming: How `process_stream` runs the node. True means `operation` takes an
+                iterator over the node's input items and returns an iterable of output items
+                (e.g. a generator that filters, splits or batches records). When False,
+                `process_stream` calls `operation` once per item. Other modes always call
+                `operation` on a single value.
+            version: Any picklable value that identifies the behavior of `operation` in
+                the disk cache along with its code. Change it when the operation's
+                results change without its code changing, e.g. after editing a helper
+                function it calls.
+        """
         if not callable(operation):
             raise TypeError(f"Operation must be callable, got {type(operation)}")
+        if vectorized is not True and vectorized is not False and not callable(vectorized):
+            raise TypeError(f"vectorized must be a bool or callable, got {type(vectorized)}")
 
         self.add_vertex(node_id)
         self.node_operations[node_id] = operation
-        
-    def process_data(self, input_data, start_node):
-        """Process data through the graph starting from a given node"""
-        # Validate start node
+        self._operations_version += 1
+        if inspect.iscoroutinefunction(operation):
+            self._coroutine_nodes.add(node_id)
+        else:
+            self._coroutine_nodes.discard(node_id)
+        if pure:
+            self._impure_nodes.discard(node_id)
+        else:
+            self._impure_nodes.add(node_id)
+        if streaming:
+            self._streaming_nodes.add(node_id)
+        else:
+            self._streaming_nodes.discard(node_id)
+        if version is None:
+            self._operation_versions.pop(node_id, None)
+        else:
+            self._operation_versions[node_id] = version
+        if self.memo is not None:
+            self.memo.discard_node(node_id)
+        if vectorized is False:
+            self.batch_operations.pop(node_id, None)
+        else:
+            self.batch_operations[node_id] = operation if vectorized is True else vectorized
+
+    def remove_vertex(self, node_id):
+        """Remove a node, its edges and its operation."""
+        super().remove_vertex(node_id)
+        self.node_operations.pop(node_id, None)
+        self._coroutine_nodes.discard(node_id)
+        self.batch_operations.pop(node_id, None)
+        self._impure_nodes.discard(node_id)
+        self._streaming_nodes.discard(node_id)
+        self._operation_versions.pop(node_id, None)
+        self._operations_version += 1
+        if self.memo is not None:
+            self.memo.discard_node(node_id)
+
+    def enable_memoization(self, max_entries: Optional[int] = 1024,
+                           max_bytes: Optional[int] = None) -> ResultCache:
+        """
+        Reuse node results across sequential `process_data` runs.
+
+        The result of every pure node is cached against a fingerprint of its input value
+        (see `memo.fingerprint`). When a later run feeds a node an input with the same
+        fingerprint, the cached result is returned instead of calling the operation, so
+        after a small change to the input only the nodes whose inputs actually changed
+        run again. Cached results are shared between runs and must not be mutated.
+
+        Args:
+            max_entries: The maximum number of cached results (unbounded when None).
+            max_bytes: The maximum estimated size of all cached results together
+                (unbounded when None). Least recently used results are evicted first.
+
+        Returns:
+            ResultCache: The cache, which also counts hits and misses.
+        """
+        self.memo = ResultCache(max_entries, max_bytes)
+        return self.memo
+
+    def disable_memoization(self):
+        """Stop reusing node results and drop the cache."""
+        self.memo = None
+
+    def enable_disk_cache(self, directory, max_bytes: Optional[int] = None) -> DiskCache:
+        """
+        Reuse node results across processes through a directory on disk.
+
+        Like `enable_memoization`, but entries are keyed by a stable fingerprint of the
+        node's operation (its code and `version`, see `memo.operation_fingerprint`) and of
+        its input, so any process running the same operation on the same input, on any
+        machine that shares the directory, reads the stored result instead of calling the
+        operation. The in-memory cache, when enabled, is consulted first. Impure nodes,
+        operations without a stable fingerprint and results that cannot be pickled are
+        never stored.
+
+        Args:
+            directory: The cache directory, created if needed.
+            max_bytes: The maximum total size of the cached results (unbounded when
+                None). Least recently used results are deleted first.
+
+        Returns:
+            DiskCache: The cache, which also counts hits and misses.
+        """
+        self.disk_cache = DiskCache(directory, max_bytes)
+        return self.disk_cache
+
+    def disable_disk_cache(self):
+        """Stop consulting the disk cache; its directory is left as it is."""
+        self.disk_cache = None
+
+    def _plan_version(self):
+        return self._version, self._operations_version
+
+    def compile(self, start_node) -> ExecutionPlan:
+        """
+        Build the execution plan for runs starting at `start_node`.
+
+        Plans are cached per start node until the graph or an operation changes, so
+        repeated calls (and `process_data`, which uses them) only pay for the nodes that
+        are actually reachable from `start_node`.
+        """
         if start_node not in self.graph:
             raise KeyError(f"Start node {start_node} not found in graph")
-
-        # Get execution order through topological sort
-        execution_order = self.topological_sort('iterative')
+        plans = self._cached('plans', dict)
+        plan = plans.get(start_node)
+        if plan is None or plan.stale:
+            plan = plans[start_node] = ExecutionPlan(self, start_node)
+        return plan
         
-        # Track intermediate results
-        results = {start_node: input_data}
-        
-        for node in execution_order:
-            if node in results:  # If we have input data for this node
-                # Get the operation for this node
-                operation = self.node_operations[node]
-                # Process the data
-                result = operation(results[node])
-                # Store result for current node
-                results[node] = result
-                # Store result for downstream nodes
-                for neighbor in self.graph[node]:
-                    results[neighbor] = result
-                    
-        return results
+    def process_data(self, input_data, start_node,
+                     executor: Literal['sequential', 'thread', 'process'] = 'sequential',
+                     max_workers: Optional[int] = None,
+                     unpicklable: Literal['fallback', 'raise'] = 'fallback',
+                     outputs=None, profiler: Optional[Profiler] = None,
+                     store: Optional[ResultStore] = None):
+        """
+        Process data through the graph starting from a given node
+
+        Every node reachable from `start_node` runs once, on the result of its predecessor
+        that comes last in topological order. With `executor='thread'` or `'process'` nodes
+        are dispatched to a pool as soon as all of their reachable predecessors have finished,
+        so independent branches overlap. Linear chains of nodes are dispatched as a single
+        task, so fine-grained nodes do not pay a round trip each. All executors return the
+        same results. The sequential executor reuses cached node results when memoization
+        or the disk cache is enabled (see `enable_memoization` and `enable_disk_cache`).
+
+        Args:
+            input_data: The input of the start node's operation.
+            start_node: The node to start from.
+            executor: 'sequential' runs the nodes one after another in topological order;
+                'thread' uses a `ThreadPoolExecutor`, for operations that release the GIL;
+                'process' uses a `ProcessPoolExecutor`, for CPU-bound Python operations.
+                Between processes, NumPy arrays and bytes of `SHARED_MEMORY_THRESHOLD` bytes
+                or more are passed through shared memory instead of being pickled.
+            max_workers: Pool size (the executor's default when None). Pools are kept
+                on the graph and reused by later runs with the same executor and size;
+                `close()` (or using the graph as a context manager) shuts them down.
+            unpicklable: What `executor='process'` does with operations that cannot be
+                pickled, such as lambdas: 'fallback' runs them on a thread pool in this
+                process, 'raise' raises a `TypeError` before anything runs.
+            outputs: Which results to return. None returns every node's result and keeps
+                them all alive until the end of the run. 'sinks' (the reachable nodes
+                without successors) or an iterable of nodes returns only those, and every
+                other result is dropped as soon as the last node that consumes it has run,
+                so peak memory follows the widest part of the graph instead of its total
+                size.
+
+            profiler: A `profiling.Profiler` that records the timing of every node call
+                in this run. Without one the operations are called directly.
+            store: A `stores.ResultStore` that holds the results during a sequential run,
+                such as a `stores.SpillingStore` that writes large intermediates to disk
+                once a memory budget is exceeded. Results are read back from the store
+                when a consumer needs them, and the returned dictionary holds what the
+                store returns (e.g. memory-mapped arrays), so close the store only after
+                using them. Memoization does not apply to runs with a store.
+
+        Returns:
+            dict: The result of every node that ran, or of the nodes selected by `outputs`.
+
+        Raises:
+            ValueError: If a node in `outputs` is not reachable from `start_node`.
+        """
+        # Validate the start node and get the cached plan of reachable nodes
+        plan = self.compile(start_node)
+
+        if store is not None and executor != 'sequential':
+            raise ValueError(f"A result store requires the 'sequential' executor, not {executor!r}")
+        if profiler is not None:
+            return self._process_data_profiled(plan, input_data, executor, max_workers, outputs, profiler, store)
+        if executor == 'sequential':
+            return plan.run(input_data, outputs, store)
+        keep = plan.select(outputs)
+        self._check_synchronous(plan)
+        if executor == 'thread':
+            return self._process_data_threaded(plan, input_data, max_workers, keep, plan.operations)
+        if executor == 'process':
+            return self._process_data_multiprocess(plan, input_data, max_workers, unpicklable, keep)
+        raise ValueError(f"Unknown executor {executor!r}")
+
+    def evaluate(self, outputs, inputs):
+        """
+        Compute only the requested node results, pulling data from the given inputs.
+
+        The graph is walked backwards from `outputs` to find the operations they depend
+        on, and only those run: branches that do not lead to a requested node are never
+        evaluated. Every node receives the result of its last predecessor in topological
+        order among those fed by the inputs, so with `inputs={start_node: data}` each
+        result equals the one `process_data(data, start_node)` returns for that node.
+        The set of operations to run is cached per combination of outputs and input nodes.
+
+        Args:
+            outputs: The nodes whose results are wanted.
+            inputs: A dictionary mapping entry nodes to the input of their operation.
+
+        Returns:
+            dict: The result of every node in `outputs`.
+
+        Raises:
+            KeyError: If a node is not in the graph.
+            ValueError: If an output does not depend on any of the inputs.
+        """
+        outputs = list(outputs)
+        schedule = self._cached('evaluations', dict)
+        key = frozenset(outputs), frozenset(inputs)
+        if key not in schedule:
+            schedule[key] = self._evaluation_schedule(*key)
+        nodes, sources = schedule[key]
+
+        operations = self.node_operations
+        coroutine_nodes = [node for node in nodes if node in self._coroutine_nodes]
+        if coroutine_nodes:
+            raise TypeError(f"Operation for node {coroutine_nodes[0]!r} is a coroutine function; "
+                            f"use process_data_async")
+
+        values = {}
+        for node, source in zip(nodes, sources):
+            values[node] = operations[node](inputs[node] if source is None else values[source])
+        return {node: values[node] for node in outputs}
+
+    def _evaluation_schedule(self, outputs, input_nodes):
+        """
+        The nodes `evaluate` runs for the given outputs and input nodes, in topological
+        order, and the node each of them receives its value from (None for input nodes).
+        """
+        for node in outputs | input_nodes:
+            if node not in self.graph:
+                raise KeyError(f"Node {node} not found in graph")
+        predecessors = self._predecessor_map()
+        position = self._topological_position()
+
+        # Everything the outputs depend on, without looking upstream of the inputs
+        ancestors = set(outputs)
+        stack = list(outputs)
+        while stack:
+            node = stack.pop()
+            if node not in input_nodes:
+                for predecessor in predecessors[node]:
+                    if predecessor not in ancestors:
+                        ancestors.add(predecessor)
+                        stack.append(predecessor)
+
+        # Of those, the nodes that data from the inputs actually reaches
+        fed = {node for node in input_nodes if node in ancestors}
+        stack = list(fed)
+        while stack:
+            for neighbor in self.graph[stack.pop()]:
+                if neighbor in ancestors and neighbor not in fed:
+                    fed.add(neighbor)
+                    stack.append(neighbor)
+
+        # Follow only the edges that carry values to the outputs
+        source_of = {}
+        stack = list(outputs)
+        while stack:
+            node = stack.pop()
+            if node in source_of:
+                continue
+            if node in input_nodes:
+                source_of[node] = None
+                continue
+            candidates = [predecessor for predecessor in predecessors[node] if predecessor in fed]
+            if not candidates:
+                raise ValueError(f"Node {node!r} does not depend on any of the inputs")
+            source_of[node] = max(candidates, key=position.__getitem__)
+            stack.append(source_of[node])
+
+        nodes = sorted(source_of, key=position.__getitem__)
+        return tuple(nodes), tuple(source_of[node] for node in nodes)
+
+    def _pool(self, executor, max_workers):
+        """The pool for `executor` ('thread' or 'process') and `max_workers`, created on first use"""
+        key = executor, max_workers
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                if executor == 'process':
+                    # Workers started after the resource tracker share it with this
+                    # process, so shared memory passed both ways is tracked only once
+                    resource_tracker.ensure_running()
+                    pool = ProcessPoolExecutor(max_workers=max_workers)
+                else:
+                    pool = ThreadPoolExecutor(max_workers=max_workers)
+                self._pools[key] = pool
+            return pool
+
+    def close(self):
+        """
+        Shut down the worker pools kept by `executor='thread'` and `'process'` runs.
+
+        Pools are created on the first run that needs them and reused by later runs, so
+        a run does not pay for starting threads or processes. The graph can still be
+        used after `close`; the next pooled run starts new pools.
+        """
+        with self._pools_lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pools'] = {}
+        del state['_pools_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pools_lock = threading.Lock()
+
+    def _process_data_threaded(self, plan, input_data, max_workers, keep, operations):
+        pool = self._pool('thread', max_workers)
+        return self._run_tasks(plan, input_data, lambda chain, value: pool.submit(
+            _run_chain, [operations[i] for i in chain], value), keep=keep)
+
+    def _process_data_profiled(self, plan, input_data, executor, max_workers, outputs, profiler, store):
+        if executor not in ('sequential', 'thread'):
+            raise ValueError(f"Profiling supports the 'sequential' and 'thread' executors, not {executor!r}")
+        if plan.stale:
+            raise RuntimeError("Execution plan is stale; compile the graph again")
+        keep = plan.select(outputs)
+        self._check_synchronous(plan)
+        operations, run = profiler.instrument(plan)
+        try:
+            if executor == 'sequential':
+                return plan._execute(input_data, keep, operations, store)
+            return self._process_data_threaded(plan, input_data, max_workers, keep, operations)
+        finally:
+            run.finish()
+
+    def process_batch(self, inputs, start_node, outputs=None):
+        """
+        Process a whole batch of inputs, running every reachable node once per batch.
+
+        Nodes registered with `vectorized` get the full column of their inputs in one call
+        and must return a column of the same length; every other node falls back to
+        calling its operation once per item. Routing between nodes is the same as in
+        `process_data`, so item `i` of every column equals what
+        `process_data(inputs[i], start_node)` computes for that node.
+
+        Args:
+            inputs: A sequence or NumPy array of input values, one per record.
+            start_node: The node to start from.
+            outputs: Which columns to return, as for `process_data`.
+
+        Returns:
+            dict: The output column of every node that ran (or of the nodes selected by
+                `outputs`): whatever a vectorized operation returned (e.g. a NumPy array),
+                or a list for per-item nodes.
+        """
+        plan = self.compile(start_node)
+        keep = plan.select(outputs)
+        self._check_synchronous(plan)
+
+        # Consecutive per-item nodes whose results are not requested are mapped as one
+        # composed operation
+        vectorized = tuple(node in self.batch_operations for node in plan.nodes)
+        chains, operations, sources, release = plan.fused(
+            frozenset(range(len(plan))) if keep is None else keep, key=vectorized)
+
+        size = len(inputs)
+        columns = [None] * len(chains)
+        for k, chain in enumerate(chains):
+            column = columns[sources[k]] if k else inputs
+            if vectorized[chain[0]]:
+                for i in chain:
+                    node = plan.nodes[i]
+                    column = self.batch_operations[node](column)
+                    if len(column) != size:
+                        raise ValueError(f"Vectorized operation for node {node!r} returned {len(column)} "
+                                         f"values for a batch of {size}")
+            else:
+                operation = operations[k]
+                column = [operation(item) for item in column]
+            columns[k] = column
+            for r in release[k]:
+                columns[r] = None
+        return {plan.nodes[chain[-1]]: columns[k] for k, chain in enumerate(chains)
+                if keep is None or chain[-1] in keep}
+
+    def process_stream(self, items, start_node, maxsize: int = 64):
+        """
+        Push a stream of items through the graph lazily.
+
+        Every reachable node runs as a stage on its own thread, consuming the items of the
+        predecessor `process_data` would feed it (the last one in topological order) and
+        passing its output items on as they are produced. Stages are connected by queues of
+        at most `maxsize` items, so a fast stage blocks until its consumers catch up, and
+        memory use does not depend on the length of the stream. A node with several
+        consumers sends each item to all of them. Once every node without successors is
+        done, the stages still running are stopped, so a stage may stop reading its input
+        early.
+
+        Args:
+            items: An iterable of input items for the start node, possibly unbounded.
+            start_node: The node to start from.
+            maxsize: The capacity of every queue between stages.
+
+        Yields:
+            tuple: `(node, item)` for every item produced by a node without successors, in
+                the order the items arrive.
+
+        Raises:
+            Exception: The first exception raised by a stage. The other stages are stopped.
+        """
+        plan = self.compile(start_node)
+        self._check_synchronous(plan)
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        inputs = [queue.Queue(maxsize) for _ in plan.nodes]
+        output = queue.Queue(maxsize)
+        stop = threading.Event()
+        errors = []
+
+        def stage(i):
+            consumers = [inputs[j] for j in dict.fromkeys(plan.fanout[i]) if plan.sources[j] == i]
+            node = plan.nodes[i]
+            try:
+                stream = iter(items) if i == 0 else _stream_items(inputs[i], stop)
+                if plan.streaming[i]:
+                    results = plan.operations[i](stream)
+                else:
+                    results = map(plan.operations[i], stream)
+                for result in results:
+                    if not plan.fanout[i]:
+                        _stream_put(output, (node, result), stop)
+                    for consumer in consumers:
+                        _stream_put(consumer, result, stop)
+                if not plan.fanout[i]:
+                    _stream_put(output, _END_OF_STREAM, stop)
+                for consumer in consumers:
+                    _stream_put(consumer, _END_OF_STREAM, stop)
+            except _StreamStopped:
+                pass
+            except BaseException as error:
+                errors.append(error)
+                stop.set()
+
+        threads = [threading.Thread(target=stage, args=(i,), daemon=True,
+                                    name=f'process_stream-{plan.nodes[i]!r}') for i in range(len(plan))]
+        for thread in threads:
+            thread.start()
+        try:
+            remaining = len(plan.sinks)
+            while remaining:
+                if errors:
+                    raise errors[0]
+                try:
+                    entry = output.get(timeout=STREAM_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if entry is _END_OF_STREAM:
+                    remaining -= 1
+                else:
+                    yield entry
+            # Every sink is done, so no item produced from here on is ever yielded; a stage
+            # that stopped reading its input early may leave its producers blocked on a
+            # full queue, so the remaining stages are stopped rather than waited for
+            stop.set()
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _check_synchronous(self, plan):
+        if plan.coroutine_nodes:
+            raise TypeError(f"Operation for node {plan.coroutine_nodes[0]!r} is a coroutine function; "
+                            f"use process_data_async")
+
+    async def process_data_async(self, input_data, start_node, max_concurrency: Optional[int] = None,
+                                 run_sync_in_threads: bool = False, outputs=None):
+        """
+        Process data through the graph on the running event loop.
+
+        Each reachable node becomes a task as soon as all of its reachable predecessors have
+        finished, so I/O-bound nodes overlap. Operations may be coroutine functions or plain
+        callables; a plain callable that returns an awaitable is awaited as well. Inputs and
+        results are the same as for `process_data`.
+
+        Args:
+            input_data: The input of the start node's operation.
+            start_node: The node to start from.
+            max_concurrency: The maximum number of node operations running at once
+                (unlimited when None).
+            run_sync_in_threads: Run plain callables with `asyncio.to_thread` instead of
+                directly on the event loop, for operations that block.
+            outputs: Which results to return, as for `process_data`.
+
+        Raises:
+            Exception: The first exception raised by a node. Every other running task is
+                cancelled and nothing downstream is started.
+        """
+        plan = self.compile(start_node)
+        keep = plan.select(outputs)
+        waiting = list(plan.in_degree)
+        remaining = list(plan.consumers)
+        semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        results = [None] * len(plan)
+
+        async def call(i, value):
+            operation = plan.operations[i]
+            if run_sync_in_threads and not inspect.iscoroutinefunction(operation):
+                result = await asyncio.to_thread(operation, value)
+            else:
+                result = operation(value)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+        async def run(i, value):
+            if semaphore is None:
+                return await call(i, value)
+            async with semaphore:
+                return await call(i, value)
+
+        pending = {asyncio.ensure_future(run(0, input_data)): 0}
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i = pending[task]
+                    results[i] = task.result()
+                    del pending[task]
+                    if not remaining[i] and keep is not None and i not in keep:
+                        results[i] = None
+                    for j in plan.fanout[i]:
+                        waiting[j] -= 1
+                        if waiting[j] == 0:
+                            source = plan.sources[j]
+                            pending[asyncio.ensure_future(run(j, results[source]))] = j
+                            plan.consume(results, remaining, keep, source)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+
+        return plan.collect(results, keep)
+
+    def _run_tasks(self, plan, input_data, submit, key=None, keep=None):
+        """
+        Ready-set scheduler shared by the pooled executors.
+
+        `submit(chain, value)` starts a chain of plan positions on its input value and
+        returns a future of the chain's results. A chain is submitted once every reachable
+        predecessor of its first node has finished. Unless `keep` is None, only the results
+        at the positions in `keep` outlive their last consumer.
+        """
+        chains = plan.chains(key)
+        chain_starting_at = {chain[0]: chain for chain in chains}
+        waiting = list(plan.in_degree)
+        remaining = list(plan.consumers)
+        results = [None] * len(plan)
+
+        pending = {submit(chain_starting_at[0], input_data): chain_starting_at[0]}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chain = pending[future]
+                    chain_results = future.result()
+                    del pending[future]
+                    for i, result in zip(chain, chain_results):
+                        result = _from_shared(result, unlink=True)
+                        # Inside a chain every result but the last is consumed already
+                        if keep is None or i in keep or (i == chain[-1] and remaining[i]):
+                            results[i] = result
+                    for j in plan.fanout[chain[-1]]:
+                        waiting[j] -= 1
+                        if waiting[j] == 0:
+                            source = plan.sources[j]
+                            pending[submit(chain_starting_at[j], results[source])] = chain_starting_at[j]
+                            plan.consume(results, remaining, keep, source)
+        except BaseException:
+            # Nothing downstream of a failed node may start
+            for future in pending:
+                future.cancel()
+            # Free shared memory handed back by tasks that were already running
+            for future in pending:
+                if not future.cancelled() and future.exception() is None:
+                    for result in future.result():
+                        _discard_shared(result)
+            raise
+
+        # Results are laid out in plan order, so they do not depend on completion order
+        return plan.collect(results, keep)
+
+    def _process_data_multiprocess(self, plan, input_data, max_workers, unpicklable, keep=None):
+        picklable = plan.picklable
+        if unpicklable == 'raise' and not all(picklable):
+            node = plan.nodes[picklable.index(False)]
+            raise TypeError(f"Operation for node {node!r} cannot be pickled for a worker process; "
+                            f"use a module-level function or unpicklable='fallback'")
+        threshold = SHARED_MEMORY_THRESHOLD
+
+        processes = self._pool('process', max_workers)
+        threads = self._pool('thread', max_workers) if not all(picklable) else None
+
+        def submit(chain, value):
+            operations = [plan.operations[i] for i in chain]
+            if not picklable[chain[0]]:
+                return threads.submit(_run_chain, operations, value)
+            value, block = _to_shared(value, threshold)
+            try:
+                future = processes.submit(_run_chain_in_worker, operations, value, threshold)
+            except BaseException:
+                if block is not None:
+                    _release(block)
+                raise
+            if block is not None:
+                future.add_done_callback(lambda _: _release(block))
+            return future
+
+        try:
+            return self._run_tasks(plan, input_data, submit, key=picklable, keep=keep)
+        except BrokenExecutor:
+            # A worker died; the next run starts a fresh pool
+            with self._pools_lock:
+                if self._pools.get(('process', max_workers)) is processes:
+                    del self._pools['process', max_workers]
+            raise
     
 
 if __name__ == '__main__':
@@ -0,0 +1,174 @@
+import contextlib
+import json
+import numbers
+import os
+from typing import Optional
+from xml.sax.saxutils import escape
+
+# Lines buffered before every write, so huge graphs are written in bounded chunks
+_CHUNK_LINES = 8192
+
+FORMATS = {'.dot': 'dot', '.gv': 'dot', '.graphml': 'graphml', '.json': 'json'}
+
+
+@contextlib.contextmanager
+def _text_output(target):
+    """Yield a writable text file: `target` itself if it has a `write` method, otherwise the opened path."""
+    if hasattr(target, 'write'):
+        yield target
+    else:
+        with open(target, 'w', encoding='utf-8') as file:
+            yield file
+
+
+class _ChunkedWriter:
+    def __init__(self, file):
+        self.file = file
+        self.lines = []
+
+    def write(self, line: str):
+        self.lines.append(line)
+        if len(self.lines) >= _CHUNK_LINES:
+            self.flush()
+
+    def flush(self):
+        self.file.write(''.join(self.lines))
+        self.lines.clear()
+
+
+def _number(weight):
+    """A weight as a plain int or float, so that NumPy scalars print as numbers"""
+    return int(weight) if isinstance(weight, numbers.Integral) else float(weight)
+
+
+def _dot_id(vertex) -> str:
+    return '"' + str(vertex).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def write_dot(dag, target, name: str = 'dag'):
+    """
+    Write a graph in the Graphviz DOT language.
+
+    Edges are written straight from the adjacency, one statement per edge, so the
+    graph is never copied. Vertices appear as quoted `str()` labels; every vertex
+    without successors also gets a statement of its own so that isolated vertices are
+    kept. Vertex and edge weights are written as `weight` attributes.
+
+    Args:
+        dag: The graph to write.
+        target: A path or a writable text file.
+        name: The name of the digraph.
+    """
+    graph, vertex_weights, edge_weights = dag.graph, dag.vertex_weights, dag.edge_weights
+    with _text_output(target) as file:
+        out = _ChunkedWriter(file)
+        out.write(f'digraph {_dot_id(name)} {{\n')
+        for vertex in graph:
+            source = _dot_id(vertex)
+            neighbors = graph[vertex]
+            if vertex in vertex_weights:
+                out.write(f'  {source} [weight={_number(vertex_weights[vertex])!r}];\n')
+            elif not neighbors:
+                out.write(f'  {source};\n')
+            for neighbor in neighbors:
+                weight = edge_weights.get((vertex, neighbor)) if edge_weights else None
+                attributes = '' if weight is None else f' [weight={_number(weight)!r}]'
+                out.write(f'  {source} -> {_dot_id(neighbor)}{attributes};\n')
+        out.write('}\n')
+        out.flush()
+
+
+def write_graphml(dag, target):
+    """
+    Write a graph as GraphML.
+
+    Vertices get the IDs `n0`, `n1`, ... in the order of `dag.graph`, with their `str()`
+    label in the `label` attribute, so vertices whose labels print alike stay distinct.
+    Weights are written as `weight` attributes.
+
+    Args:
+        dag: The graph to write.
+        target: A path or a writable text file.
+    """
+    graph, vertex_weights, edge_weights = dag.graph, dag.vertex_weights, dag.edge_weights
+    index = graph.index if dag.frozen else {vertex: i for i, vertex in enumerate(graph)}
+    with _text_output(target) as file:
+        out = _ChunkedWriter(file)
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                  '  <key id="label" for="node" attr.name="label" attr.type="string"/>\n'
+                  '  <key id="vertex_weight" for="node" attr.name="weight" attr.type="double"/>\n'
+                  '  <key id="edge_weight" for="edge" attr.name="weight" attr.type="double"/>\n'
+                  '  <graph edgedefault="directed">\n')
+        for vertex, i in index.items():
+            weight = vertex_weights.get(vertex)
+            data = '' if weight is None else f'<data key="vertex_weight">{_number(weight)!r}</data>'
+            out.write(f'    <node id="n{i}"><data key="label">{escape(str(vertex))}</data>{data}</node>\n')
+        for vertex, i in index.items():
+            for neighbor in graph[vertex]:
+                weight = edge_weights.get((vertex, neighbor)) if edge_weights else None
+                if weight is None:
+                    out.write(f'    <edge source="n{i}" target="n{index[neighbor]}"/>\n')
+                else:
+                    out.write(f'    <edge source="n{i}" target="n{index[neighbor]}">'
+                              f'<data key="edge_weight">{_number(weight)!r}</data></edge>\n')
+        out.write('  </graph>\n</graphml>\n')
+        out.flush()
+
+
+def write_json(dag, target):
+    """
+    Write a graph as a JSON edge list.
+
+    The document is `{"directed": true, "vertices": [...], "edges": [[from, to], ...]}`,
+    with a third element on the edges that have a weight and a `vertex_weights` list of
+    `[vertex, weight]` pairs. Vertices that JSON cannot represent are written as their
+    `str()`.
+
+    Args:
+        dag: The graph to write.
+        target: A path or a writable text file.
+    """
+    graph, vertex_weights, edge_weights = dag.graph, dag.vertex_weights, dag.edge_weights
+    encode = json.JSONEncoder(default=str).encode
+    label = {vertex: encode(vertex) for vertex in graph}
+    with _text_output(target) as file:
+        out = _ChunkedWriter(file)
+        out.write('{"directed": true,\n "vertices": [')
+        separator = ''
+        for encoded in label.values():
+            out.write(separator + encoded)
+            separator = ', '
+        out.write('],\n "edges": [')
+        separator = '\n  '
+        for vertex in graph:
+            source = label[vertex]
+            for neighbor in graph[vertex]:
+                weight = edge_weights.get((vertex, neighbor)) if edge_weights else None
+                suffix = '' if weight is None else ', ' + encode(_number(weight))
+                out.write(f'{separator}[{source}, {label[neighbor]}{suffix}]')
+                separator = ',\n  '
+        out.write('],\n "vertex_weights": [')
+        out.write(', '.join(f'[{encode(vertex)}, {encode(_number(weight))}]' for vertex, weight in vertex_weights.items()))
+        out.write(']}\n')
+        out.flush()
+
+
+WRITERS = {'dot': write_dot, 'graphml': write_graphml, 'json': write_json}
+
+
+def export(dag, path, format: Optional[str] = None):
+    """
+    Write a graph to `path` in one of `WRITERS`, chosen from the file extension unless
+    `format` is given.
+
+    Raises:
+        ValueError: If the format is unknown or cannot be inferred from the extension.
+    """
+    if format is None:
+        format = FORMATS.get(os.path.splitext(os.fspath(path))[1].lower())
+        if format is None:
+            raise ValueError(f"Cannot infer the export format of {path}; pass one of {sorted(WRITERS)}")
+    if format not in WRITERS:
+        raise ValueError(f"Unknown export format {format!r}; expected one of {sorted(WRITERS)}")
+    WRITERS[format](dag, path)
@@ -0,0 +1,434 @@
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import types
+from collections import OrderedDict
+from stat import S_ISREG
+from typing import Hashable, Optional
+
+# Returned by `ResultCache.get` and `DiskCache.get` for keys that are not cached
+MISSING = object()
+
+
+class _CanonicalSet(tuple):
+    """A set or frozenset replaced by its type name and sorted element fingerprints, for hashing"""
+
+    __slots__ = ()
+
+
+class _Unhashable(Exception):
+    pass
+
+
+# Exact container types searched for nested sets by `_canonical`
+_CONTAINERS = frozenset((list, tuple, dict, set, frozenset))
+
+
+def _canonical(value):
+    """
+    `value` with every set and frozenset, also when nested in lists, tuples and dicts,
+    replaced by a `_CanonicalSet`. Sets iterate (and pickle) in hash order, which differs
+    between processes for strings. Containers without sets are returned unchanged.
+    """
+    kind = type(value)
+    if kind is set or kind is frozenset:
+        fingerprints = [fingerprint(item) for item in value]
+        if None in fingerprints:
+            raise _Unhashable
+        return _CanonicalSet((kind.__name__, *sorted(fingerprints)))
+    if kind is list or kind is tuple:
+        if _CONTAINERS.isdisjoint(map(type, value)):
+            return value
+        items = [_canonical(item) for item in value]
+        return items if kind is list else tuple(items)
+    if kind is dict:
+        if _CONTAINERS.isdisjoint(map(type, value)) and _CONTAINERS.isdisjoint(map(type, value.values())):
+            return value
+        return {_canonical(key): _canonical(item) for key, item in value.items()}
+    return value
+
+
+def fingerprint(value) -> Optional[bytes]:
+    """
+    Hash a value by content, stably across processes.
+
+    NumPy arrays are hashed from their dtype, shape and raw bytes, bytes and strings
+    directly, and everything else from its pickle. Sets and frozensets, including those
+    nested in lists, tuples and dicts, are hashed from their sorted element fingerprints,
+    since their iteration order depends on the hash seed; sets inside other objects are
+    pickled as they are.
+
+    Returns:
+        bytes: A 16-byte BLAKE2b digest, or None if the value cannot be hashed (e.g. it
+            cannot be pickled). Values without a fingerprint are never looked up.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.ndarray) and value.dtype.kind != 'O':
+        digest.update(b'ndarray')
+        digest.update(value.dtype.str.encode())
+        digest.update(repr(value.shape).encode())
+        digest.update(memoryview(numpy.ascontiguousarray(value)).cast('B'))
+    elif isinstance(value, (bytes, bytearray)):
+        digest.update(type(value).__name__.encode())
+        digest.update(value)
+    elif isinstance(value, str):
+        digest.update(b'str')
+        digest.update(value.encode('utf-8', 'surrogatepass'))
+    else:
+        try:
+            data = pickle.dumps(_canonical(value), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return None
+        digest.update(b'pickle')
+        digest.update(data)
+    return digest.digest()
+
+
+def operation_fingerprint(operation, version=None) -> Optional[bytes]:
+    """
+    Hash an operation by identity and code, stably across processes.
+
+    Functions are hashed from their module, qualified name, bytecode, constants,
+    default arguments, the values captured by their closure and the module globals their
+    code reads. Global functions of the same module are hashed the same way, recursively;
+    modules, classes and functions of other modules by name only, and globals that cannot
+    be pickled by type. `functools.partial` objects are hashed from their function and
+    arguments; other callables from their type and pickled state. The Python version is
+    mixed in because bytecode differs between versions. Changes to code in other modules
+    are not detected, so pass a new `version` when they matter.
+
+    Returns:
+        bytes: A 16-byte BLAKE2b digest, or None if the operation cannot be hashed
+            (e.g. it captures a value that cannot be pickled).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((sys.version_info[:2], version)).encode())
+    return digest.digest() if _hash_callable(digest, operation, set()) else None
+
+
+def _hash_callable(digest, operation, seen) -> bool:
+    if id(operation) in seen:  # recursive closures
+        return True
+    seen.add(id(operation))
+    if isinstance(operation, functools.partial):
+        arguments = fingerprint((operation.args, sorted(operation.keywords.items())))
+        if arguments is None:
+            return False
+        digest.update(arguments)
+        return _hash_callable(digest, operation.func, seen)
+
+    # Callable instances are identified by their pickled state
+    state = operation if not hasattr(operation, '__qualname__') else getattr(operation, '__self__', None)
+    if state is not None and not isinstance(state, types.ModuleType):
+        state_fingerprint = fingerprint(state)
+        if state_fingerprint is None:
+            return False
+        digest.update(state_fingerprint)
+    digest.update(f'{getattr(operation, "__module__", None)}.'
+                  f'{getattr(operation, "__qualname__", type(operation).__qualname__)}'.encode())
+
+    code = getattr(operation, '__code__', None)
+    if code is None:  # builtins and classes
+        return True
+    names = set()
+    _hash_code(digest, code, names)
+    for cell in operation.__closure__ or ():
+        value = cell.cell_contents
+        if callable(value) and not isinstance(value, type):
+            if not _hash_callable(digest, value, seen):
+                return False
+            continue
+        value_fingerprint = fingerprint(value)
+        if value_fingerprint is None:
+            return False
+        digest.update(value_fingerprint)
+    defaults = fingerprint((operation.__defaults__, operation.__kwdefaults__))
+    if defaults is None:
+        return False
+    digest.update(defaults)
+
+    # co_names also lists attribute names; those that happen to match a global only
+    # make the fingerprint more specific
+    namespace = getattr(operation, '__globals__', {})
+    for name in sorted(names):
+        if name in namespace:
+            digest.update(name.encode())
+            if not _hash_global(digest, namespace[name], operation.__module__, seen):
+                return False
+    return True
+
+
+def _hash_global(digest, value, module, seen) -> bool:
+    if isinstance(value, types.ModuleType):
+        digest.update(f'module {value.__name__}'.encode())
+        return True
+    if isinstance(value, types.FunctionType) and value.__module__ == module:
+        return _hash_callable(digest, value, seen)
+    if isinstance(value, (type, types.FunctionType, types.BuiltinFunctionType)):
+        digest.update(f'{value.__module__}.{value.__qualname__}'.encode())
+        return True
+    value_fingerprint = fingerprint(value)
+    if value_fingerprint is None:
+        value_fingerprint = f'{type(value).__module__}.{type(value).__qualname__}'.encode()
+    digest.update(value_fingerprint)
+    return True
+
+
+def _hash_code(digest, code, names):
+    """Hash a code object and the code nested in it; collect the global names they read in `names`"""
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    names.update(code.co_names)
+    for constant in code.co_consts:
+        if hasattr(constant, 'co_code'):
+            _hash_code(digest, constant, names)
+        else:
+            digest.update(_constant_repr(constant).encode())
+
+
+def _constant_repr(constant) -> str:
+    """`repr` of a code constant, with the elements of frozensets (e.g. from `x in {...}`) sorted"""
+    if isinstance(constant, frozenset):
+        return 'frozenset({' + ', '.join(sorted(map(_constant_repr, constant))) + '})'
+    if isinstance(constant, tuple):
+        return '(' + ', '.join(map(_constant_repr, constant)) + ',)'
+    return repr(constant)
+
+
+def estimate_size(value) -> int:
+    """Approximate memory footprint of a value in bytes: buffer sizes for arrays, otherwise shallow sizes."""
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return size
+
+
+class ResultCache:
+    """
+    Least-recently-used store of node results, bounded by entry count and total size.
+
+    Keys are `(node, input fingerprint)` pairs. Every entry also keeps the fingerprint
+    of the result, so a cache hit tells the downstream nodes their own input fingerprint
+    without hashing the result again.
+
+    Attributes:
+        max_entries: The maximum number of cached results (unbounded when None).
+        max_bytes: The maximum total `estimate_size` of the cached results (unbounded
+            when None). A result larger than this on its own is not cached.
+        hits: Lookups that found a result.
+        misses: Lookups that did not.
+    """
+
+    def __init__(self, max_entries: Optional[int] = 1024, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key -> (result, result fingerprint, size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(entries={len(self._entries)}, nbytes={self.nbytes}, '
+                f'hits={self.hits}, misses={self.misses})')
+
+    def get(self, key):
+        """Return `(result, result fingerprint)` for `key` and mark it recently used, or `MISSING`."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, key, result, result_fingerprint: Optional[bytes]):
+        """Cache a result, evicting the least recently used entries to stay within the limits."""
+        size = estimate_size(result)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (result, result_fingerprint, size)
+        self.nbytes += size
+        while ((self.max_entries is not None and len(self._entries) > self.max_entries)
+               or (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+
+    def discard_node(self, node: Hashable):
+        """Drop every cached result of `node`, e.g. after its operation changed."""
+        for key in [key for key in self._entries if key[0] == node]:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+
+# Hex digits in the name of a disk cache entry: a two-digit folder and the rest
+_ENTRY_DIGITS = 40
+_HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+def _is_hex(name: str, digits: int) -> bool:
+    return len(name) == digits and _HEX_DIGITS.issuperset(name)
+
+
+class DiskCache:
+    """
+    Persistent node results in a content-addressed directory.
+
+    Every entry is one file named after the hash of its key, written atomically (to a
+    temporary file that is then renamed), so several processes, or machines sharing a
+    filesystem, can use the same directory. A file's modification time records its last
+    use. The directory is scanned once, when the cache is opened, into an in-memory
+    index of entry sizes in least-recently-used order; `get` and `put` keep the index up
+    to date, and when the total size exceeds `max_bytes` the least recently used entries
+    are deleted without scanning the directory again. Entries written by other processes
+    join the index when this process reads them. Files that are not named like entries
+    are left alone, so the cache can share a directory with other data.
+
+    Attributes:
+        directory: The cache directory.
+        max_bytes: The maximum total size of the entries (unbounded when None).
+        nbytes: The total size of the indexed entries.
+        hits: Lookups that found a result.
+        misses: Lookups that did not.
+    """
+
+    def __init__(self, directory, max_bytes: Optional[int] = None):
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = OrderedDict()  # path -> size, least recently used first
+        for _, size, path in sorted(self._entries()):
+            self._index[path] = size
+        self.nbytes = sum(self._index.values())
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.directory!r}, nbytes={self.nbytes}, hits={self.hits}, misses={self.misses})'
+
+    def _path(self, key: bytes) -> str:
+        name = hashlib.blake2b(key, digest_size=_ENTRY_DIGITS // 2).hexdigest()
+        return os.path.join(self.directory, name[:2], name[2:])
+
+    def _entries(self):
+        """
+        Every entry on disk as `(last use, size, path)`.
+
+        Only files laid out like `_path` names them are entries, so other files in the
+        directory are never indexed, evicted or cleared.
+        """
+        for prefix in os.listdir(self.directory):
+            folder = os.path.join(self.directory, prefix)
+            if not _is_hex(prefix, 2) or not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if _is_hex(name, _ENTRY_DIGITS - 2):
+                    path = os.path.join(folder, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:  # evicted by another process
+                        continue
+                    if S_ISREG(stat.st_mode):
+                        yield stat.st_mtime, stat.st_size, path
+
+    def get(self, key: bytes):
+        """Return `(result, result fingerprint)` for `key` and mark it recently used, or `MISSING`."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                result_fingerprint, result = pickle.load(file)
+                size = file.tell()
+        except FileNotFoundError:
+            self.misses += 1
+            self._forget(path)
+            return MISSING
+        except Exception:
+            # A damaged entry, or one that refers to a class that was moved or renamed,
+            # is dropped and recomputed
+            self.misses += 1
+            self._remove(path)
+            self._forget(path)
+            return MISSING
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._track(path, size)
+        self.hits += 1
+        return result, result_fingerprint
+
+    def put(self, key: bytes, result, result_fingerprint: Optional[bytes]):
+        """Store a result, unless it cannot be pickled or is larger than `max_bytes`."""
+        try:
+            data = pickle.dumps((result_fingerprint, result), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            self._remove(temporary)
+            raise
+        self._track(path, len(data))
+        if self.max_bytes is not None and self.nbytes > self.max_bytes:
+            self._evict()
+
+    def _track(self, path, size):
+        """Record an entry as the most recently used one."""
+        self.nbytes += size - self._index.pop(path, 0)
+        self._index[path] = size
+
+    def _forget(self, path):
+        self.nbytes -= self._index.pop(path, 0)
+
+    def _evict(self):
+        index = self._index
+        while self.nbytes > self.max_bytes and index:
+            path, size = index.popitem(last=False)
+            self.nbytes -= size
+            self._remove(path)
+
+    def clear(self):
+        for _, _, path in list(self._entries()):
+            self._remove(path)
+        self._index.clear()
+        self.nbytes = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from dag import DAG
+from memo import estimate_size
+
+
+class Profiler:
+    """
+    Per-node measurements of `DataFlowGraph.process_data` runs.
+
+    Pass a profiler as `process_data(..., profiler=profiler)`; every run it sees adds one
+    event per node call. Runs without a profiler are not instrumented at all.
+
+    Every event records:
+        node: The node.
+        run: The index of the run.
+        ready: When all of the node's reachable predecessors had finished (the start of
+            the run for the start node).
+        start, end: Wall-clock interval of the operation call.
+        cpu: CPU time of the calling thread during the call.
+        thread: The identifier of the thread that made the call.
+        output_size: The estimated size of the result in bytes (see `memo.estimate_size`),
+            or None when `measure_output_size` is False.
+
+    Times are seconds since the profiler was created.
+    """
+
+    def __init__(self, measure_output_size: bool = True):
+        self.measure_output_size = measure_output_size
+        self.events: List[dict] = []
+        self.runs = 0
+        self._edges = set()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def instrument(self, plan) -> Tuple[tuple, '_Run']:
+        """
+        Wrap the operations of an execution plan for one run.
+
+        Returns:
+            tuple: The wrapped operations, in plan order, and the run to `finish` once
+                the operations have been called.
+        """
+        with self._lock:
+            run = _Run(self, plan, self.runs)
+            self.runs += 1
+        return tuple(run.wrap(i, operation) for i, operation in enumerate(plan.operations)), run
+
+    def node_stats(self) -> Dict:
+        """
+        Aggregate the events per node.
+
+        Returns:
+            dict: For every node, its call count, total/mean/max wall time, total CPU
+                time, total queueing delay and total output size.
+        """
+        stats = {}
+        for event in self.events:
+            wall = event['end'] - event['start']
+            entry = stats.get(event['node'])
+            if entry is None:
+                entry = stats[event['node']] = {'calls': 0, 'wall': 0.0, 'max_wall': 0.0, 'cpu': 0.0,
+                                                'queue_delay': 0.0, 'output_bytes': 0}
+            entry['calls'] += 1
+            entry['wall'] += wall
+            entry['max_wall'] = max(entry['max_wall'], wall)
+            entry['cpu'] += event['cpu']
+            entry['queue_delay'] += event['start'] - event['ready']
+            entry['output_bytes'] += event['output_size'] or 0
+        for entry in stats.values():
+            entry['mean_wall'] = entry['wall'] / entry['calls']
+        return stats
+
+    def critical_path(self) -> Tuple[float, List]:
+        """
+        Find the chain of nodes that determines the latency of a run.
+
+        Every node is weighted by its mean latency per call, i.e. queueing delay plus
+        wall time, and the heaviest path along the profiled edges is returned (see
+        `DAG.critical_path`).
+
+        Returns:
+            tuple: The summed mean latency of the path in seconds and its nodes.
+        """
+        graph = DAG()
+        for node, entry in self.node_stats().items():
+            graph.add_vertex(node, weight=(entry['wall'] + entry['queue_delay']) / entry['calls'])
+        for from_node, to_node in self._edges:
+            if from_node in graph.graph and to_node in graph.graph:
+                graph.add_edge(from_node, to_node)
+        return graph.critical_path(default_vertex_weight=0)
+
+    def report(self) -> dict:
+        """A JSON-serializable summary: run count, per-node statistics and the critical path."""
+        length, path = self.critical_path()
+        return {
+            'runs': self.runs,
+            'nodes': {repr(node): entry for node, entry in self.node_stats().items()},
+            'critical_path': {'latency': length, 'nodes': [repr(node) for node in path]},
+        }
+
+    def save_json(self, path):
+        """Write `report()` to `path`."""
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def chrome_trace(self) -> dict:
+        """
+        The events in the Chrome trace event format.
+
+        Load the file written by `save_chrome_trace` in chrome://tracing, Perfetto or
+        speedscope to see every node call as a slice on the thread that ran it.
+        """
+        pid = os.getpid()
+        trace = []
+        for event in self.events:
+            trace.append({
+                'name': repr(event['node']),
+                'cat': f"run {event['run']}",
+                'ph': 'X',
+                'ts': event['start'] * 1e6,
+                'dur': (event['end'] - event['start']) * 1e6,
+                'pid': pid,
+                'tid': event['thread'],
+                'args': {'cpu_ms': event['cpu'] * 1e3,
+                         'queue_delay_ms': (event['start'] - event['ready']) * 1e3,
+                         'output_bytes': event['output_size']},
+            })
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def save_chrome_trace(self, path):
+        """Write `chrome_trace()` to `path`."""
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+
+class _Run:
+    """The measurements of one run, in plan order, until `finish` turns them into events"""
+
+    def __init__(self, profiler: Profiler, plan, index: int):
+        self.profiler = profiler
+        self.plan = plan
+        self.index = index
+        self.begin = time.perf_counter()
+        self.timings = [None] * len(plan)
+
+    def wrap(self, i, operation):
+        timings = self.timings
+        measure_output_size = self.profiler.measure_output_size
+
+        def instrumented(value):
+            cpu = time.thread_time()
+            start = time.perf_counter()
+            result = operation(value)
+            end = time.perf_counter()
+            timings[i] = (start, end, time.thread_time() - cpu, threading.get_ident(),
+                          estimate_size(result) if measure_output_size else None)
+            return result
+
+        return instrumented
+
+    def finish(self):
+        """Derive queueing delays from the plan's edges and hand the events to the profiler."""
+        plan, timings, origin = self.plan, self.timings, self.profiler._origin
+        ready = [self.begin] * len(plan)
+        for i, successors in enumerate(plan.fanout):
+            if timings[i] is not None:
+                for j in successors:
+                    ready[j] = max(ready[j], timings[i][1])
+
+        events = []
+        for i, timing in enumerate(timings):
+            if timing is None:  # not called: a memoized result, or the run failed first
+                continue
+            start, end, cpu, thread, output_size = timing
+            events.append({'node': plan.nodes[i], 'run': self.index, 'ready': ready[i] - origin,
+                           'start': start - origin, 'end': end - origin, 'cpu': cpu,
+                           'thread': thread, 'output_size': output_size})
+        edges = {(plan.nodes[i], plan.nodes[j]) for i, successors in enumerate(plan.fanout) for j in successors}
+        with self.profiler._lock:
+            self.profiler.events.extend(events)
+            self.profiler._edges.update(edges)
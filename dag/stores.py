@@ -0,0 +1,195 @@
+import itertools
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from memo import estimate_size
+
+
+class ResultStore(ABC):
+    """
+    Where `DataFlowGraph.process_data(..., store=...)` keeps node results during a run.
+
+    A store maps nodes to their results. Results are put once, read by every consumer
+    and discarded when they are no longer needed (see the `outputs` argument of
+    `process_data`). Subclasses implement `put`, `get` and `discard`.
+    """
+
+    @abstractmethod
+    def put(self, key: Hashable, value):
+        """Store `value` under `key`, replacing any previous value."""
+
+    @abstractmethod
+    def get(self, key: Hashable):
+        """Return the value stored under `key`; raise `KeyError` if there is none."""
+
+    @abstractmethod
+    def discard(self, key: Hashable):
+        """Forget the value stored under `key`, if any."""
+
+    def close(self):
+        """Release every resource held by the store."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MemoryStore(ResultStore):
+    """Keeps every result in a dictionary, like `process_data` does without a store."""
+
+    def __init__(self):
+        self._values = {}
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def put(self, key, value):
+        self._values[key] = value
+
+    def get(self, key):
+        return self._values[key]
+
+    def discard(self, key):
+        self._values.pop(key, None)
+
+    def close(self):
+        self._values.clear()
+
+
+class SpillingStore(ResultStore):
+    """
+    Keeps results in memory up to a budget and spills the rest to local files.
+
+    When the estimated size of the results in memory (see `memo.estimate_size`) exceeds
+    `memory_budget`, the least recently used ones are written out: NumPy arrays as `.npy`
+    files, everything else as a pickle. Spilled values are read back only when they are
+    requested, arrays as read-only memory maps, so only the pages a consumer touches are
+    loaded. Values that cannot be pickled stay in memory, even beyond the budget, and the
+    next least recently used values are spilled instead.
+
+    Spilled arrays handed out by `get` keep working until the store is closed, so a
+    store used for `process_data` should be closed after its results are consumed.
+
+    Attributes:
+        memory_budget: The maximum number of bytes held in memory.
+        nbytes: The estimated size of the results currently in memory.
+        spills: How many results were written to disk.
+    """
+
+    def __init__(self, memory_budget: int, directory: Optional[str] = None):
+        """
+        Args:
+            memory_budget: The maximum number of bytes held in memory.
+            directory: Where to write spilled results. By default a temporary directory
+                is created on the first spill and removed by `close`.
+        """
+        self.memory_budget = memory_budget
+        self.nbytes = 0
+        self.spills = 0
+        self._directory = directory
+        self._owns_directory = directory is None
+        self._memory = OrderedDict()  # key -> (value, size)
+        self._spilled = {}  # key -> path
+        self._unspillable = set()  # keys in memory whose values could not be written
+        self._names = itertools.count()
+
+    def __contains__(self, key):
+        return key in self._memory or key in self._spilled
+
+    def __len__(self):
+        return len(self._memory) + len(self._spilled)
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(memory_budget={self.memory_budget}, in_memory={len(self._memory)}, '
+                f'spilled={len(self._spilled)})')
+
+    def is_spilled(self, key) -> bool:
+        return key in self._spilled
+
+    def put(self, key, value):
+        self.discard(key)
+        size = estimate_size(value)
+        self._memory[key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.memory_budget:
+            excess = self.nbytes - self.memory_budget
+            candidates = []
+            for candidate, (_, candidate_size) in self._memory.items():
+                if excess <= 0:
+                    break
+                if candidate not in self._unspillable:
+                    candidates.append(candidate)
+                    excess -= candidate_size
+            if not candidates:
+                break
+            for candidate in candidates:
+                candidate_value, candidate_size = self._memory[candidate]
+                path = self._spill(candidate_value)
+                if path is None:
+                    self._unspillable.add(candidate)
+                    continue
+                del self._memory[candidate]
+                self.nbytes -= candidate_size
+                self._spilled[candidate] = path
+
+    def get(self, key):
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry[0]
+        path = self._spilled[key]
+        if path.endswith('.npy'):
+            import numpy
+            return numpy.load(path, mmap_mode='r')
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    def discard(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+            self._unspillable.discard(key)
+        path = self._spilled.pop(key, None)
+        if path is not None:
+            os.remove(path)
+
+    def close(self):
+        for key in list(self._memory) + list(self._spilled):
+            self.discard(key)
+        if self._owns_directory and self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def _spill(self, value) -> Optional[str]:
+        """Write a value to a new file and return its path, or None if it cannot be written."""
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='dfg-spill-')
+        name = os.path.join(self._directory, str(next(self._names)))
+        numpy = sys.modules.get('numpy')
+        try:
+            if numpy is not None and isinstance(value, numpy.ndarray) and value.dtype.kind != 'O':
+                path = name + '.npy'
+                numpy.save(path, value, allow_pickle=False)
+            else:
+                path = name + '.pkl'
+                with open(path, 'wb') as file:
+                    pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        self.spills += 1
+        return path
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+from bench import GENERATORS, compare, dense_random_edges, main, run
+from dag import DAG
+
+
+@pytest.mark.parametrize("generator, params, num_edges", [
+    ('chain', {'n': 10}, 9),
+    ('fan', {'n': 10}, 16),
+    ('layered', {'layers': 3, 'width': 4, 'fanout': 2}, 16),
+])
+def test_generators_build_acyclic_graphs(generator, params, num_edges):
+    edges = GENERATORS[generator](seed=1, **params)
+    assert len(edges) == num_edges
+    dag = DAG()
+    dag.add_edges_from(edges)
+    assert not dag.has_cycle()
+
+def test_dense_random_edges_are_seeded():
+    edges = dense_random_edges(200, 0.5, seed=4)
+    assert edges == dense_random_edges(200, 0.5, seed=4)
+    assert edges != dense_random_edges(200, 0.5, seed=5)
+    assert all(i < j for i, j in edges)
+    assert 0.45 < len(edges) / (200 * 199 / 2) < 0.55
+    assert len(dense_random_edges(10, 1.0)) == 45
+    assert dense_random_edges(10, 0.0) == []
+
+def test_run_and_compare(tmp_path):
+    report = run('tiny', repeat=1, calls=1, generators=['chain'])
+    operations = {record['operation'] for record in report['results']}
+    assert {'construct.add_edge', 'topological_sort.recursive', 'has_cycle.iterative', 'process_data'} <= operations
+    assert all(record['vertices'] == 100 for record in report['results'])
+
+    rows = compare(report, report)
+    assert len(rows) == len(report['results'])
+    assert all(row['ratio'] == 1 for row in rows)
+
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(report))
+    output = tmp_path / 'report.json'
+    main(['--size', 'tiny', '--generator', 'fan', '--repeat', '1', '--calls', '1',
+          '--output', str(output), '--compare', str(baseline)])
+    assert json.loads(output.read_text())['meta']['size'] == 'tiny'
+
+if __name__ == "__main__":
+    pytest.main()
@@ -1,5 +1,15 @@
+import random
+
 import pytest
-from dag import DAG
+from dag import DAG, CycleError
+
+
+def assert_valid_order(dag, order):
+    position = {vertex: i for i, vertex in enumerate(order)}
+    assert len(order) == len(dag.graph) == len(position)
+    for vertex, neighbors in dag.graph.items():
+        for neighbor in neighbors:
+            assert position[vertex] < position[neighbor]
 
 
 def test_add_vertex():
@@ -32,5 +42,546 @@ def test_topological_sort(method):
     dag.add_edge('A', 'C')
     assert dag.topological_sort(method) in [['A', 'B', 'C'], ['A', 'C', 'B']]
 
+@pytest.mark.parametrize("method", ['iterative', 'recursive'])
+def test_frozen_graph_keeps_analyses(method):
+    dag = DAG()
+    dag.add_edge('A', 'B')
+    dag.add_edge('B', 'C')
+    dag.add_edge('A', 'C')
+    dag.freeze()
+    assert dag.frozen
+    assert dag.graph['A'] == ['B', 'C']
+    assert 'C' in dag.graph and len(dag.graph) == 3
+    assert dag.topological_sort(method) == ['A', 'B', 'C']
+    assert not dag.has_cycle(method)
+
+def test_frozen_graph_rejects_mutation_until_thawed():
+    dag = DAG()
+    dag.add_edge('A', 'B')
+    dag.freeze()
+    dag.add_vertex('A')  # already present, so nothing changes
+    with pytest.raises(RuntimeError):
+        dag.add_edge('B', 'C')
+    with pytest.raises(RuntimeError):
+        dag.add_vertex('C')
+    with pytest.raises(RuntimeError):
+        dag.add_vertex('C', weight=2)
+    assert 'C' not in dag.vertex_weights
+    dag.thaw()
+    dag.add_edge('B', 'A')
+    assert dag.graph == {'A': ['B'], 'B': ['A']}
+    assert dag.freeze().has_cycle()
+
+def test_maintained_order_rejects_cycle_with_path():
+    dag = DAG(maintain_order=True)
+    dag.add_edge('C', 'D')
+    dag.add_edge('B', 'C')
+    dag.add_edge('A', 'B')
+    assert dag.topological_sort() == ['A', 'B', 'C', 'D']
+    with pytest.raises(CycleError) as excinfo:
+        dag.add_edge('D', 'B')
+    assert excinfo.value.cycle == ['D', 'B', 'C', 'D']
+    with pytest.raises(ValueError):
+        dag.add_edge('A', 'A')
+    # Rejected edges leave the graph untouched
+    assert dag.graph == {'C': ['D'], 'D': [], 'B': ['C'], 'A': ['B']}
+    assert dag.topological_sort() == ['A', 'B', 'C', 'D']
+
+def test_maintained_order_matches_random_inserts():
+    rng = random.Random(7)
+    dag = DAG(maintain_order=True)
+    reference = DAG()
+    for _ in range(2000):
+        u, v = rng.randrange(60), rng.randrange(60)
+        try:
+            dag.add_edge(u, v)
+        except CycleError as error:
+            cycle = error.cycle
+            assert cycle[0] == cycle[-1] == u and cycle[1] == v
+            assert all(b in dag.graph[a] for a, b in zip(cycle[1:], cycle[2:]))
+            continue
+        reference.add_edge(u, v)
+        assert_valid_order(dag, dag.topological_sort())
+    assert dag.graph == reference.graph
+    assert not reference.has_cycle()
+
+@pytest.mark.parametrize("method", ['iterative', 'recursive'])
+def test_deep_chain_beyond_recursion_limit(method):
+    dag = DAG()
+    for i in range(20000):
+        dag.add_edge(i, i + 1)
+    assert not dag.has_cycle(method)
+    assert dag.topological_sort(method) == list(range(20001))
+    dag.add_edge(20000, 0)
+    assert dag.has_cycle(method)
+
+def test_find_cycle():
+    dag = DAG()
+    dag.add_edge('A', 'B')
+    dag.add_edge('B', 'C')
+    dag.add_edge('A', 'C')
+    assert dag.find_cycle() is None
+    dag.add_edge('C', 'D')
+    dag.add_edge('D', 'B')
+    assert dag.find_cycle() == ['B', 'C', 'D', 'B']
+
+def test_strongly_connected_components_and_condensation():
+    dag = DAG()
+    for u, v in [('A', 'B'), ('B', 'C'), ('C', 'A'), ('C', 'D'), ('D', 'E'), ('E', 'D'), ('F', 'A')]:
+        dag.add_edge(u, v)
+    components = dag.strongly_connected_components()
+    assert sorted(map(sorted, components)) == [['A', 'B', 'C'], ['D', 'E'], ['F']]
+
+    condensed, members = dag.condensation()
+    assert [sorted(m) for m in members] == [['F'], ['A', 'B', 'C'], ['D', 'E']]
+    assert condensed.graph == {0: [1], 1: [2], 2: []}
+    assert not condensed.has_cycle()
+
+def test_add_edges_from_matches_add_edge():
+    edges = [('A', 'B'), ('B', 'C'), ('A', 'B'), ('D', 'A')]
+    expected = DAG()
+    for u, v in edges:
+        expected.add_edge(u, v)
+    dag = DAG()
+    dag.add_edges_from(iter(edges))
+    assert list(dag.graph.items()) == list(expected.graph.items())
+
+    dag = DAG()
+    dag.add_edges_from(edges, dedupe=True, vertices=['D', 'C'])
+    assert list(dag.graph) == ['D', 'C', 'A', 'B']
+    assert dag.graph['A'] == ['B']
+
+def test_add_edges_from_maintained_order_rejects_cycles():
+    dag = DAG(maintain_order=True)
+    with pytest.raises(CycleError):
+        dag.add_edges_from([('A', 'B'), ('B', 'C'), ('C', 'A')])
+    assert dag.graph == {'A': ['B'], 'B': ['C'], 'C': []}
+
+def test_add_edge_array():
+    np = pytest.importorskip('numpy')
+    edges = np.array([[2, 0], [0, 1], [2, 1], [0, 1], [4, 4]])
+    dag = DAG()
+    dag.add_edge_array(edges)
+    assert list(dag.graph.items()) == [(0, [1, 1]), (1, []), (2, [0, 1]), (4, [4])]
+
+    dag = DAG()
+    dag.add_edge('z', 'a')
+    dag.add_edge_array(edges[:4], labels=['a', 'b', 'c'], dedupe=True)
+    assert list(dag.graph.items()) == [('z', ['a']), ('a', ['b']), ('b', []), ('c', ['a', 'b'])]
+    with pytest.raises(ValueError):
+        dag.add_edge_array(np.arange(3))
+
+def test_from_edge_array():
+    np = pytest.importorskip('numpy')
+    edges = np.array([[2, 0], [0, 1], [2, 1], [0, 1]])
+    dag = DAG.from_edge_array(edges, labels=['a', 'b', 'c', 'd'])
+    assert dag.frozen
+    assert dag.thaw().graph == {'a': ['b', 'b'], 'b': [], 'c': ['a', 'b'], 'd': []}
+
+    dag = DAG.from_edge_array(edges, dedupe=True)
+    assert dag.topological_sort() == [2, 0, 1]
+    assert dag.graph[0] == [1]
+    with pytest.raises(ValueError):
+        DAG.from_edge_array(edges, labels=['a'])
+
+    # Keys of int32 IDs must not overflow and merge distinct edges
+    edges = np.array([[42950, 0], [0, 32704], [0, 32704], [99999, 0]], dtype=np.int32)
+    dag = DAG.from_edge_array(edges, dedupe=True)
+    assert sum(map(len, dag.thaw().graph.values())) == 3
+
+    # IDs wider than 16 bits are sorted one 16-bit digit at a time; the order within
+    # every adjacency list is kept
+    rng = np.random.default_rng(0)
+    edges = rng.integers(0, 200_000, size=(5000, 2))
+    dag = DAG.from_edge_array(edges).thaw()
+    expected = {}
+    for u, v in edges.tolist():
+        expected.setdefault(u, []).append(v)
+    assert all(dag.graph[u] == neighbors for u, neighbors in expected.items())
+    assert sum(map(len, dag.graph.values())) == len(edges)
+
+def test_load_edgelist(tmp_path):
+    path = tmp_path / 'edges.txt'
+    path.write_text('# source target\n1 2\n\n2 3 0.5\n1 2\n')
+    dag = DAG()
+    dag.load_edgelist(path, vertex_type=int, chunk_size=2, dedupe=True)
+    assert dag.graph == {1: [2], 2: [3], 3: []}
+
+    path = tmp_path / 'edges.csv'
+    path.write_text('from,to\n"x, y",z\nz,w\n')
+    dag = DAG()
+    dag.load_edgelist(path, delimiter=',', header=True)
+    assert dag.graph == {'x, y': ['z'], 'z': ['w'], 'w': []}
+
+def test_analyses_are_cached_until_mutation(monkeypatch):
+    dag = DAG()
+    dag.add_edge('A', 'B')
+    dag.add_edge('B', 'C')
+    dag.add_edge('A', 'C')
+    calls = []
+    original = dag._topological_sort_iterative
+    monkeypatch.setattr(dag, '_topological_sort_iterative', lambda: calls.append(1) or original())
+
+    order = dag.topological_sort()
+    order.append('X')  # callers get their own copy
+    assert dag.topological_sort() == ['A', 'B', 'C']
+    assert not dag.has_cycle()
+    assert len(calls) == 1
+    assert dag.in_degrees() == {'A': 0, 'B': 1, 'C': 2}
+    assert dag.vertex_levels() == {'A': 0, 'B': 1, 'C': 2}
+
+    version = dag.version
+    dag.add_edge('C', 'D')
+    assert dag.version > version
+    assert dag.topological_sort() == ['A', 'B', 'C', 'D']
+    assert len(calls) == 2
+
+    dag.graph['D'].append('A')  # direct edits need an explicit invalidation
+    dag.invalidate_cache()
+    assert dag.has_cycle() and dag.has_cycle('recursive')
+    with pytest.raises(ValueError, match="Graph has at least one cycle"):
+        dag.topological_sort()
+    assert dag.find_cycle() == ['A', 'B', 'C', 'D', 'A']
+
+def test_reachability_queries():
+    dag = DAG()
+    for u, v in [('A', 'B'), ('B', 'C'), ('A', 'C'), ('D', 'C'), ('C', 'E')]:
+        dag.add_edge(u, v)
+    assert dag.reaches('A', 'E')
+    assert not dag.reaches('E', 'A')
+    assert not dag.reaches('A', 'A')
+    assert not dag.reaches('B', 'D')
+    assert dag.descendants('A') == ['B', 'C', 'E']
+    assert dag.descendants('E') == []
+    dag.add_edge('E', 'F')
+    assert dag.descendants('D') == ['C', 'E', 'F']
+
+def test_transitive_closure_and_reduction():
+    rng = random.Random(3)
+    dag = DAG()
+    for _ in range(300):
+        u = rng.randrange(40)
+        dag.add_edge(u, rng.randrange(u, 41) + 1)
+
+    closure = dag.transitive_closure()
+    reduction = dag.transitive_reduction()
+    reduced_closure = reduction.transitive_closure()
+    for vertex in dag.graph:
+        assert set(closure.graph[vertex]) == set(dag.descendants(vertex))
+        assert set(reduced_closure.graph[vertex]) == set(closure.graph[vertex])
+        assert set(reduction.graph[vertex]) <= set(dag.graph[vertex])
+        # No kept edge is implied by another kept edge
+        for neighbor in reduction.graph[vertex]:
+            others = [w for w in reduction.graph[vertex] if w != neighbor]
+            assert not any(reduction.reaches(w, neighbor) for w in others)
+
+    diamond = DAG()
+    for u, v in [('A', 'B'), ('A', 'C'), ('B', 'D'), ('C', 'D'), ('A', 'D'), ('A', 'B')]:
+        diamond.add_edge(u, v)
+    assert diamond.transitive_reduction().graph == {'A': ['B', 'C'], 'B': ['D'], 'C': ['D'], 'D': []}
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_and_load_round_trip(tmp_path, mmap):
+    dag = DAG()
+    dag.add_edges_from([('A', 'B'), ('B', 'C'), ('A', 'C'), ('A', 'C'), (1, 'A')])
+    dag.add_vertex(('tuple', 2))
+    path = tmp_path / 'graph.dag'
+    dag.save(path)
+
+    loaded = DAG.load(path, mmap=mmap)
+    assert loaded.frozen
+    assert dict(loaded.graph) == dag.graph
+    assert loaded.topological_sort() == dag.topological_sort()
+    assert loaded.thaw().graph == dag.graph
+
+def test_load_uses_stored_order(tmp_path, monkeypatch):
+    dag = DAG()
+    dag.add_edges_from([(3, 2), (2, 1), (1, 0)])
+    path = tmp_path / 'graph.dag'
+    dag.save(path)
+    loaded = DAG.load(path)
+    monkeypatch.setattr(loaded, '_topological_sort_iterative', lambda: pytest.fail("graph was re-sorted"))
+    assert loaded.topological_sort() == [3, 2, 1, 0]
+
+    dag.add_edge(0, 3)
+    dag.save(path)
+    assert DAG.load(path).has_cycle()
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'graph.dag'
+    path.write_bytes(b'not a snapshot' * 10)
+    with pytest.raises(ValueError):
+        DAG.load(path)
+
+def test_topological_levels():
+    dag = DAG()
+    for u, v in [('A', 'B'), ('A', 'C'), ('B', 'D'), ('C', 'D'), ('A', 'D'), ('E', 'C')]:
+        dag.add_edge(u, v)
+    dag.add_vertex('F')
+    assert dag.topological_levels() == [['A', 'E', 'F'], ['B', 'C'], ['D']]
+    assert list(dag.generations()) == dag.topological_levels()
+    assert dag.depth() == 3
+    assert dag.width() == 3
+    assert dag.vertex_levels()['D'] == 2
+
+    dag.add_edge('D', 'A')
+    with pytest.raises(ValueError):
+        dag.topological_levels()
+    assert DAG().depth() == 0 and DAG().width() == 0
+
+def build_job_graph():
+    dag = DAG()
+    for vertex, cost in [('fetch', 2), ('parse', 3), ('index', 4), ('stats', 1), ('report', 2)]:
+        dag.add_vertex(vertex, weight=cost)
+    dag.add_edge('fetch', 'parse')
+    dag.add_edge('parse', 'index')
+    dag.add_edge('parse', 'stats', weight=5)  # e.g. a slow transfer
+    dag.add_edge('index', 'report')
+    dag.add_edge('stats', 'report')
+    return dag
+
+def test_critical_path():
+    dag = build_job_graph()
+    assert dag.critical_path() == (13, ['fetch', 'parse', 'stats', 'report'])
+    assert dag.critical_path(default_edge_weight=0)[0] == 13
+    unweighted = DAG()
+    unweighted.add_edges_from([(1, 2), (2, 3), (1, 3)])
+    assert unweighted.critical_path() == (3, [1, 2, 3])
+    assert DAG().critical_path() == (0, [])
+
+def test_path_lengths():
+    dag = build_job_graph()
+    distance, predecessor = dag.path_lengths('parse', mode='shortest', default_edge_weight=0)
+    assert distance == {'parse': 3, 'index': 7, 'stats': 9, 'report': 9}
+    assert dag.path_to(predecessor, 'report') == ['parse', 'index', 'report']
+
+    distance, predecessor = dag.path_lengths(['index', 'stats'])
+    assert distance == {'index': 4, 'stats': 1, 'report': 7}
+    assert predecessor == {'report': 'index'}
+    with pytest.raises(KeyError, match="'missing'"):
+        dag.path_lengths('missing')
+    with pytest.raises(KeyError, match="42"):
+        dag.path_lengths(42)
+    assert dag.path_lengths(('index', 'stats'))[0] == distance
+
+@pytest.mark.parametrize("mode", ['longest', 'shortest'])
+def test_batched_path_lengths_match_single_source(mode):
+    np = pytest.importorskip('numpy')
+    rng = random.Random(11)
+    dag = DAG()
+    for _ in range(200):
+        u = rng.randrange(30)
+        dag.add_edge(u, rng.randrange(u + 1, 31), weight=rng.randint(1, 9) if rng.random() < 0.5 else None)
+    for vertex in list(dag.graph)[::3]:
+        dag.add_vertex(vertex, weight=rng.randint(0, 5))
+
+    sources = [0, 5, 17, 30]
+    labels, distance, predecessor = dag.batched_path_lengths(sources, mode=mode)
+    column = {vertex: j for j, vertex in enumerate(labels)}
+    for row, source in enumerate(sources):
+        expected, _ = dag.path_lengths(source, mode=mode)
+        reachable = {vertex: distance[row, j] for vertex, j in column.items() if np.isfinite(distance[row, j])}
+        assert reachable == expected
+        for vertex in expected:
+            path = dag.path_to(predecessor[row], vertex)
+            assert path[0] == source and path[-1] == vertex
+            length = sum(dag.vertex_weights.get(v, 0) for v in path)
+            length += sum(dag.edge_weights.get(edge, 1) for edge in zip(path, path[1:]))
+            assert length == expected[vertex]
+
+MODES = [{}, {'track_predecessors': True}, {'maintain_order': True}]
+
+@pytest.mark.parametrize("kwargs", MODES)
+def test_predecessor_queries(kwargs):
+    dag = DAG(**kwargs)
+    dag.add_edges_from([('A', 'B'), ('A', 'C'), ('B', 'D'), ('C', 'D'), ('D', 'E'), ('X', 'E')])
+    assert sorted(dag.predecessors('D')) == ['B', 'C']
+    assert dag.in_degree('D') == 2 and dag.in_degree('A') == 0
+    ancestors = dag.ancestors('E')
+    assert set(ancestors) == {'A', 'B', 'C', 'D', 'X'}
+    assert ancestors.index('A') < ancestors.index('B') < ancestors.index('D')
+    assert dag.ancestors('A') == []
+    dag.add_edges_from([('A', 'B'), ('B', 'F')], dedupe=True)
+    assert dag.in_degree('B') == 1 and dag.predecessors('F') == ['B']
+
+@pytest.mark.parametrize("kwargs", MODES)
+def test_dedupe_collapses_existing_parallel_edges(kwargs):
+    dag = DAG(**kwargs)
+    dag.add_edge('A', 'B')
+    dag.add_edge('A', 'B')
+    dag.add_edge('X', 'B')
+    dag.add_edge('X', 'B')
+    dag.add_edges_from([('A', 'C'), ('A', 'C')], dedupe=True)
+    assert dag.graph['A'] == ['B', 'C'] and dag.graph['X'] == ['B', 'B']
+    assert sorted(dag.predecessors('B')) == ['A', 'X', 'X'] and dag.in_degree('B') == 3
+    assert dag.predecessors('C') == ['A'] and dag.in_degree('C') == 1
+    assert dag.topological_sort()[0] in ('A', 'X')
+
+@pytest.mark.parametrize("kwargs", MODES)
+def test_remove_edge_and_vertex(kwargs):
+    dag = DAG(**kwargs)
+    dag.add_edge('A', 'B', weight=2)
+    dag.add_edge('A', 'B')
+    dag.add_edge('B', 'C', weight=3)
+    dag.add_edge('A', 'C')
+    dag.add_vertex('B', weight=5)
+    order = dag.topological_sort()
+
+    dag.remove_edge('A', 'B')
+    assert dag.graph['A'] == ['B', 'C'] and dag.in_degree('B') == 1
+    assert dag.edge_weights[('A', 'B')] == 2  # a parallel edge is left
+    dag.remove_edge('A', 'B')
+    assert ('A', 'B') not in dag.edge_weights and dag.predecessors('B') == []
+    with pytest.raises(KeyError):
+        dag.remove_edge('A', 'B')
+
+    dag.add_edge('A', 'B')
+    dag.remove_vertex('B')
+    assert 'B' not in dag.graph and dag.graph['A'] == ['C']
+    assert dag.predecessors('C') == ['A'] and dag.in_degree('C') == 1
+    assert 'B' not in dag.vertex_weights and ('B', 'C') not in dag.edge_weights
+    assert dag.topological_sort() == [vertex for vertex in order if vertex != 'B']
+    with pytest.raises(KeyError):
+        dag.remove_vertex('B')
+
+@pytest.mark.parametrize("kwargs", MODES[1:])
+def test_tracked_indexes_match_rebuilt_graph(kwargs):
+    rng = random.Random(7)
+    dag = DAG(**kwargs)
+    for _ in range(300):
+        u, v = sorted(rng.sample(range(40), 2))
+        action = rng.random()
+        if action < 0.6:
+            dag.add_edge(u, v)
+        elif action < 0.8 and v in dag.graph.get(u, ()):
+            dag.remove_edge(u, v)
+        elif u in dag.graph:
+            dag.remove_vertex(u)
+        if dag.maintain_order and rng.random() < 0.1:
+            assert_valid_order(dag, dag.topological_sort())
+
+    rebuilt = DAG()
+    rebuilt.graph = {vertex: list(neighbors) for vertex, neighbors in dag.graph.items()}
+    assert dag.in_degrees() == rebuilt.in_degrees()
+    for vertex in dag.graph:
+        assert sorted(dag.predecessors(vertex)) == sorted(rebuilt.predecessors(vertex))
+    assert_valid_order(dag, dag.topological_sort())
+
+def test_from_edge_array_builds_indexes():
+    np = pytest.importorskip('numpy')
+    dag = DAG.from_edge_array(np.array([[0, 1], [1, 2], [0, 2]]), maintain_order=True)
+    assert dag.predecessors(2) == [0, 1] and dag.in_degree(2) == 2
+    assert dag.topological_sort() == [0, 1, 2]
+    with pytest.raises(CycleError):
+        DAG.from_edge_array(np.array([[0, 1], [1, 0]]), maintain_order=True)
+
+def weighted_sample_dag():
+    dag = DAG()
+    dag.add_edges_from([('A', 'B'), ('A', 'C'), ('B', 'D'), ('C', 'D')])
+    dag.add_vertex('say "hi"\n', weight=2.5)
+    dag.edge_weights[('A', 'B')] = 3
+    return dag
+
+@pytest.mark.parametrize("frozen", [False, True])
+def test_export_formats(tmp_path, frozen):
+    import json
+    import re
+    import xml.etree.ElementTree as ET
+
+    dag = weighted_sample_dag()
+    if frozen:
+        dag.freeze()
+    edges = sorted((u, v) for u in dag.graph for v in dag.graph[u])
+
+    dag.export(tmp_path / 'g.json')
+    document = json.loads((tmp_path / 'g.json').read_text())
+    assert document['vertices'] == list(dag.graph)
+    assert sorted((edge[0], edge[1]) for edge in document['edges']) == edges
+    assert ['A', 'B', 3] in document['edges']
+    assert document['vertex_weights'] == [['say "hi"\n', 2.5]]
+
+    dag.export(tmp_path / 'g.graphml')
+    namespace = {'g': 'http://graphml.graphdrawing.org/xmlns'}
+    root = ET.parse(tmp_path / 'g.graphml').getroot()
+    labels = {node.get('id'): node.find("g:data[@key='label']", namespace).text
+              for node in root.iter('{%s}node' % namespace['g'])}
+    assert sorted(labels.values()) == sorted(map(str, dag.graph))
+    assert sorted((labels[edge.get('source')], labels[edge.get('target')])
+                  for edge in root.iter('{%s}edge' % namespace['g'])) == edges
+
+    dag.export(tmp_path / 'g.gv')
+    text = (tmp_path / 'g.gv').read_text()
+    assert text.startswith('digraph "dag" {') and text.rstrip().endswith('}')
+    assert sorted(re.findall(r'"(\w)" -> "(\w)"', text)) == edges
+    assert '"A" -> "B" [weight=3];' in text
+    assert '"say \\"hi\\"\\n" [weight=2.5];' in text
+
+    # NumPy weights are written as plain numbers
+    np = pytest.importorskip('numpy')
+    dag = weighted_sample_dag()
+    dag.vertex_weights['say "hi"\n'] = np.float64(2.5)
+    dag.edge_weights[('A', 'B')] = np.int64(3)
+    dag.edge_weights[('A', 'C')] = np.float32(0.5)
+    dag.export(tmp_path / 'numpy.gv')
+    text = (tmp_path / 'numpy.gv').read_text()
+    assert '"A" -> "B" [weight=3];' in text and '"A" -> "C" [weight=0.5];' in text and 'np.' not in text
+    dag.export(tmp_path / 'numpy.graphml')
+    weights = [float(data.text) for data in ET.parse(tmp_path / 'numpy.graphml').getroot().iter('{%s}data' % namespace['g'])
+               if data.get('key').endswith('weight')]
+    assert sorted(weights) == [0.5, 2.5, 3.0]
+    dag.export(tmp_path / 'numpy.json')
+    document = json.loads((tmp_path / 'numpy.json').read_text())
+    assert ['A', 'B', 3] in document['edges'] and ['A', 'C', 0.5] in document['edges']
+
+    with pytest.raises(ValueError):
+        dag.export(tmp_path / 'g.txt')
+    with pytest.raises(ValueError):
+        dag.export(tmp_path / 'g.txt', format='svg')
+
+def brute_force_crossings(layout):
+    column = {node: i for layer in layout.layers for i, node in enumerate(layer)}
+    level = {node: k for k, layer in enumerate(layout.layers) for node in layer}
+    edges = [(u, v, count) for (u, v), count in layout.edges.items() if level[v] == level[u] + 1]
+    return sum(c1 * c2 for i, (u1, v1, c1) in enumerate(edges) for u2, v2, c2 in edges[:i]
+               if level[u1] == level[u2] and (column[u1] - column[u2]) * (column[v1] - column[v2]) < 0)
+
+def test_layered_layout():
+    from bench import layered_edges
+
+    dag = DAG()
+    dag.add_edges_from(layered_edges(6, 12, 2, seed=3))
+    levels = dag.vertex_levels()
+    unordered = dag.layered_layout(sweeps=0)
+    layout = dag.layered_layout()
+    for vertex, (x, y) in layout.positions.items():
+        assert y == -levels[vertex]
+    for u, v in layout.edges:
+        assert layout.positions[u][1] > layout.positions[v][1]
+    assert sum(layout.edges.values()) == sum(map(len, dag.graph.values()))
+    assert layout.crossings() == brute_force_crossings(layout)
+    assert unordered.crossings() == brute_force_crossings(unordered)
+    assert layout.crossings() < unordered.crossings()
+
+    dag.add_edge(next(iter(layout.layers[-1])), next(iter(layout.layers[0])))
+    with pytest.raises(ValueError):
+        dag.layered_layout()
+
+def test_layered_layout_collapses_wide_levels():
+    from layout import Group
+    from bench import fan_edges
+
+    dag = DAG()
+    dag.add_edges_from(fan_edges(1002))
+    layout = dag.layered_layout(max_width=10)
+    assert [len(layer) for layer in layout.layers] == [1, 10, 1]
+    groups = layout.layers[1]
+    assert all(isinstance(group, Group) and len(group) == 100 for group in groups)
+    assert {vertex for group in groups for vertex in group.members} == set(range(1, 1001))
+    assert all(layout.node_of[vertex] is group for group in groups for vertex in group.members)
+    assert layout.edges[(0, groups[0])] == layout.edges[(groups[-1], 1001)] == 100
+    assert sum(layout.edges.values()) == 2000
+    with pytest.raises(ValueError, match="max_width"):
+        dag.layered_layout(max_width=0)
+
 if __name__ == "__main__":
     pytest.main()
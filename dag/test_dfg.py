@@ -1,5 +1,16 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+
+import dfg as dfg_module
 import pytest
 from dfg import DataFlowGraph
+from memo import MISSING, DiskCache, ResultCache, fingerprint, operation_fingerprint
+from profiling import Profiler
+from stores import MemoryStore, ResultStore, SpillingStore
 
 
 def test_simple_linear_flow():
@@ -107,6 +118,843 @@ def test_multiple_paths_same_result():
     assert results1 == results2
 
 
+def test_execution_order_is_cached(monkeypatch):
+    """Test that repeated runs on an unchanged graph sort it only once"""
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, lambda x: x * 2)
+    dfg.add_operation(2, lambda x: x + 10)
+    dfg.add_edge(1, 2)
+    calls = []
+    original = dfg._topological_sort_iterative
+    monkeypatch.setattr(dfg, '_topological_sort_iterative', lambda: calls.append(1) or original())
+
+    for _ in range(3):
+        assert dfg.process_data(5, start_node=1)[2] == 20
+    assert len(calls) == 1
+
+    dfg.add_operation(3, lambda x: -x)
+    dfg.add_edge(2, 3)
+    assert dfg.process_data(5, start_node=1)[3] == -20
+    assert len(calls) == 2
+
+
+def test_frozen_graph_flow():
+    """Test processing data through a graph stored in the compact CSR backend"""
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, lambda x: x * 2)
+    dfg.add_operation(2, lambda x: x + 10)
+    dfg.add_operation(3, lambda x: str(x))
+    dfg.add_edge(1, 2)
+    dfg.add_edge(2, 3)
+    dfg.freeze()
+
+    results = dfg.process_data(5, start_node=1)
+    assert results[3] == "20"
+
+
+def test_load_prebuilt_pipeline(tmp_path):
+    """Test attaching operations to a pipeline structure loaded from a snapshot"""
+    dfg = DataFlowGraph()
+    dfg.add_edge(1, 2)
+    dfg.add_edge(2, 3)
+    dfg.save(tmp_path / 'pipeline.dag')
+
+    loaded = DataFlowGraph.load(tmp_path / 'pipeline.dag')
+    loaded.add_operation(1, lambda x: x * 2)
+    loaded.add_operation(2, lambda x: x + 10)
+    loaded.add_operation(3, lambda x: str(x))
+    assert loaded.process_data(5, start_node=1)[3] == "20"
+
+
+def build_diamond():
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, lambda x: x * 2)
+    dfg.add_operation(2, lambda x: x + 5)
+    dfg.add_operation(3, lambda x: x ** 2)
+    dfg.add_operation(4, lambda x: str(x))
+    dfg.add_operation(5, lambda x: x - 1)  # not reachable from 1
+    dfg.add_edge(1, 2)
+    dfg.add_edge(1, 3)
+    dfg.add_edge(2, 4)
+    dfg.add_edge(3, 4)
+    dfg.add_edge(5, 3)
+    return dfg
+
+
+def test_thread_executor_matches_sequential():
+    """Test that the thread pool produces exactly the sequential results"""
+    dfg = build_diamond()
+    expected = dfg.process_data(5, start_node=1)
+    assert 5 not in expected
+    for max_workers in (1, 4):
+        assert dfg.process_data(5, start_node=1, executor='thread', max_workers=max_workers) == expected
+    assert dfg.process_data(7, start_node=3, executor='thread') == dfg.process_data(7, start_node=3)
+
+
+def test_thread_executor_runs_branches_concurrently():
+    """Test that independent branches of the diamond run at the same time"""
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(offset):
+        def operation(x):
+            barrier.wait()  # only passes if both branches are running together
+            return x + offset
+        return operation
+
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, lambda x: x)
+    dfg.add_operation(2, branch(1))
+    dfg.add_operation(3, branch(2))
+    dfg.add_operation(4, lambda x: x)
+    for u, v in [(1, 2), (1, 3), (2, 4), (3, 4)]:
+        dfg.add_edge(u, v)
+    results = dfg.process_data(0, start_node=1, executor='thread', max_workers=2)
+    assert results == {1: 0, 2: 1, 3: 2, 4: 2}
+
+
+def test_thread_executor_error_propagation():
+    """Test that a failing node raises and stops everything downstream"""
+    ran = []
+    dfg = DataFlowGraph()
+
+    def failing_operation(x):
+        raise ValueError("Operation failed")
+
+    dfg.add_operation(1, lambda x: x)
+    dfg.add_operation(2, failing_operation)
+    dfg.add_operation(3, ran.append)
+    dfg.add_edge(1, 2)
+    dfg.add_edge(2, 3)
+    with pytest.raises(ValueError, match="Operation failed"):
+        dfg.process_data(5, start_node=1, executor='thread')
+    assert ran == []
+    with pytest.raises(ValueError, match="Unknown executor"):
+        dfg.process_data(5, start_node=1, executor='fibers')
+
+
+def double(x):
+    return x * 2
+
+
+def add_ten(x):
+    return x + 10
+
+
+def negate(x):
+    return -x
+
+
+def reverse_bytes(data):
+    return data[::-1]
+
+
+def build_picklable_diamond():
+    dfg = DataFlowGraph()
+    for node, operation in [(1, double), (2, add_ten), (3, negate), (4, double), (5, add_ten)]:
+        dfg.add_operation(node, operation)
+    for u, v in [(1, 2), (1, 3), (2, 4), (3, 4), (4, 5)]:
+        dfg.add_edge(u, v)
+    return dfg
+
+
+def test_process_executor_matches_sequential():
+    """Test that the process pool produces exactly the sequential results"""
+    dfg = build_picklable_diamond()
+    expected = dfg.process_data(5, start_node=1)
+    assert dfg.process_data(5, start_node=1, executor='process', max_workers=2) == expected
+
+
+def test_process_executor_unpicklable_operations():
+    """Test that lambdas fall back to threads or fail clearly"""
+    dfg = build_picklable_diamond()
+    dfg.add_operation(3, lambda x: x - 1)
+    expected = dfg.process_data(5, start_node=1)
+    assert dfg.process_data(5, start_node=1, executor='process', max_workers=2) == expected
+    with pytest.raises(TypeError, match="node 3 cannot be pickled"):
+        dfg.process_data(5, start_node=1, executor='process', unpicklable='raise')
+
+
+def test_process_executor_shares_large_values(monkeypatch):
+    """Test that large bytes and arrays cross process boundaries through shared memory"""
+    np = pytest.importorskip('numpy')
+    monkeypatch.setattr(dfg_module, 'SHARED_MEMORY_THRESHOLD', 16)
+    shared = []
+    original = dfg_module._to_shared
+    monkeypatch.setattr(dfg_module, '_to_shared', lambda value, threshold: shared.append(type(value)) or original(value, threshold))
+
+    dfg = DataFlowGraph()
+    dfg.add_operation('array', double)
+    dfg.add_operation('bytes', reverse_bytes)
+    dfg.add_edge('array', 'tail')
+    dfg.add_operation('tail', lambda x: x.sum())  # runs on the fallback thread pool
+    results = dfg.process_data(np.arange(100), start_node='array', executor='process')
+    assert np.array_equal(results['array'], np.arange(100) * 2)
+    assert results['tail'] == 9900
+    assert shared == [np.ndarray]
+    assert dfg.process_data(b'0123456789' * 4, start_node='bytes', executor='process')['bytes'] == b'9876543210' * 4
+
+
+def test_process_executor_error_propagation():
+    """Test that errors raised in worker processes reach the caller"""
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, double)
+    dfg.add_operation(2, reverse_bytes)
+    dfg.add_edge(1, 2)
+    with pytest.raises(TypeError):
+        dfg.process_data(5, start_node=1, executor='process')
+
+
+def test_process_executor_reuses_pools():
+    """Test that pooled runs reuse the graph's pools until it is closed"""
+    with build_picklable_diamond() as dfg:
+        expected = dfg.process_data(5, start_node=1)
+        assert dfg.process_data(5, start_node=1, executor='process', max_workers=2) == expected
+        pools = dict(dfg._pools)
+        assert dfg.process_data(5, start_node=1, executor='process', max_workers=2) == expected
+        assert dfg.process_data(5, start_node=1, executor='thread', max_workers=2) == expected
+        assert dfg._pools[('process', 2)] is pools[('process', 2)]
+        assert set(dfg._pools) == {('process', 2), ('thread', 2)}
+    assert dfg._pools == {}
+    assert dfg.process_data(5, start_node=1, executor='thread') == expected
+    dfg.close()
+
+
+def test_process_executor_shared_memory_is_not_leaked():
+    """Test that shared memory created in workers leaves no resource tracker warnings"""
+    import subprocess
+    import sys
+
+    # The first value is small, so the workers start before anything is put into
+    # shared memory; bytes() and bytearray() then pass 2 MB values both ways
+    script = (
+        "from dfg import DataFlowGraph\n"
+        "if __name__ == '__main__':\n"
+        "    dfg = DataFlowGraph()\n"
+        "    dfg.add_operation('bytes', bytes)\n"
+        "    dfg.add_operation('copy', bytearray)\n"
+        "    dfg.add_operation('size', len)\n"
+        "    dfg.add_edge('bytes', 'copy')\n"
+        "    dfg.add_edge('copy', 'size')\n"
+        "    dfg.add_edge('bytes', 'size')\n"
+        "    for _ in range(3):\n"
+        "        assert dfg.process_data(2_000_000, 'bytes', executor='process', max_workers=2,\n"
+        "                                outputs=['size']) == {'size': 2_000_000}\n"
+    )
+    completed = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=60,
+                               cwd=os.path.dirname(os.path.abspath(dfg_module.__file__)))
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stderr == ''
+
+
+def test_async_pipeline_matches_sequential():
+    """Test that the asyncio executor mixes coroutine and plain operations"""
+    async def slow_double(x):
+        await asyncio.sleep(0)
+        return x * 2
+
+    dfg = build_diamond()
+    expected = dfg.process_data(5, start_node=1)
+    dfg.add_operation(1, slow_double)
+    assert asyncio.run(dfg.process_data_async(5, start_node=1)) == expected
+    assert asyncio.run(dfg.process_data_async(5, start_node=1, max_concurrency=1,
+                                              run_sync_in_threads=True)) == expected
+    with pytest.raises(TypeError, match="process_data_async"):
+        dfg.process_data(5, start_node=1)
+    assert dfg.process_data(5, start_node=5)[5] == 4  # the coroutine node is not reachable
+
+
+def test_async_pipeline_overlaps_and_limits_concurrency():
+    """Test that ready nodes run concurrently, up to max_concurrency at a time"""
+    running = []
+    peak = []
+
+    async def fetch(x):
+        running.append(x)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(x)
+        return x
+
+    dfg = DataFlowGraph()
+    dfg.add_operation('root', lambda x: x)
+    for i in range(6):
+        dfg.add_operation(i, fetch)
+        dfg.add_edge('root', i)
+    assert asyncio.run(dfg.process_data_async(1, start_node='root'))[5] == 1
+    assert max(peak) == 6
+    peak.clear()
+    asyncio.run(dfg.process_data_async(1, start_node='root', max_concurrency=2))
+    assert max(peak) == 2
+
+
+def test_async_pipeline_cancels_on_failure():
+    """Test that a failing node cancels running siblings and skips downstream nodes"""
+    cancelled = []
+    ran = []
+
+    async def slow(x):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(x)
+            raise
+
+    async def failing(x):
+        raise ValueError("Operation failed")
+
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, lambda x: x)
+    dfg.add_operation(2, slow)
+    dfg.add_operation(3, failing)
+    dfg.add_operation(4, ran.append)
+    for u, v in [(1, 2), (1, 3), (3, 4)]:
+        dfg.add_edge(u, v)
+    with pytest.raises(ValueError, match="Operation failed"):
+        asyncio.run(dfg.process_data_async(5, start_node=1))
+    assert cancelled == [5]
+    assert ran == []
+
+
+def test_process_batch_matches_per_record_runs():
+    """Test that batch columns line up with one process_data call per record"""
+    np = pytest.importorskip('numpy')
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, lambda x: x * 2, vectorized=True)
+    dfg.add_operation(2, lambda x: x + 5, vectorized=lambda column: np.asarray(column) + 5)
+    dfg.add_operation(3, lambda x: x ** 2)
+    dfg.add_operation(4, lambda x: str(x))
+    for u, v in [(1, 2), (1, 3), (2, 4), (3, 4)]:
+        dfg.add_edge(u, v)
+
+    inputs = np.arange(10)
+    columns = dfg.process_batch(inputs, start_node=1)
+    assert isinstance(columns[1], np.ndarray) and isinstance(columns[4], list)
+    for i, value in enumerate(inputs.tolist()):
+        expected = dfg.process_data(value, start_node=1)
+        assert {node: column[i] for node, column in columns.items()} == expected
+
+    assert dfg.process_batch([1, 2], start_node=3) == {3: [1, 4], 4: ['1', '4']}
+
+
+def test_process_batch_checks_vectorized_lengths():
+    """Test that vectorized operations must keep the batch length"""
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, sum, vectorized=lambda column: [sum(column)])
+    with pytest.raises(ValueError, match="returned 1 values for a batch of 3"):
+        dfg.process_batch([1, 2, 3], start_node=1)
+    with pytest.raises(TypeError):
+        dfg.add_operation(2, sum, vectorized='yes')
+
+
+def test_compiled_plan_covers_reachable_nodes():
+    """Test that a compiled plan holds only the reachable nodes and reproduces process_data"""
+    dfg = build_diamond()
+    plan = dfg.compile(1)
+    assert plan.nodes[0] == 1 and set(plan.nodes) == {1, 2, 3, 4}
+    assert plan.sources[0] == -1
+    assert plan.nodes[plan.sources[plan.nodes.index(4)]] == 3
+    assert plan.in_degree[plan.nodes.index(4)] == 2
+    assert plan.run(5) == plan(5) == dfg.process_data(5, start_node=1)
+
+    assert dfg.compile(3).nodes == (3, 4)
+    with pytest.raises(KeyError):
+        dfg.compile(42)
+
+
+def test_compiled_plan_is_reused_and_invalidated():
+    """Test that plans are cached per start node until the graph or an operation changes"""
+    dfg = build_diamond()
+    plan = dfg.compile(1)
+    assert dfg.compile(1) is plan
+
+    dfg.add_operation(2, lambda x: x + 6)
+    assert plan.stale
+    with pytest.raises(RuntimeError, match="stale"):
+        plan.run(5)
+    plan = dfg.compile(1)
+    assert plan.run(5)[2] == 16
+
+    dfg.add_operation(6, len)
+    dfg.add_edge(4, 6)
+    assert dfg.compile(1) is not plan
+    assert dfg.process_data(5, start_node=1)[6] == 3
+
+
+def test_memoization_recomputes_only_changed_nodes():
+    """Test that memoized runs reuse results of nodes whose input did not change"""
+    calls = []
+
+    def tracked(node, operation):
+        return lambda x: calls.append(node) or operation(x)
+
+    dfg = DataFlowGraph()
+    dfg.add_operation('params', tracked('params', lambda p: p))
+    dfg.add_operation('scale', tracked('scale', lambda p: p['scale']))
+    dfg.add_operation('offset', tracked('offset', lambda p: p['offset']))
+    dfg.add_operation('scaled', tracked('scaled', lambda s: s * 10))
+    dfg.add_operation('report', tracked('report', lambda o: f"offset={o}"))
+    dfg.add_operation('log', tracked('log', lambda o: o), pure=False)
+    for u, v in [('params', 'scale'), ('params', 'offset'), ('scale', 'scaled'),
+                 ('offset', 'report'), ('offset', 'log')]:
+        dfg.add_edge(u, v)
+    memo = dfg.enable_memoization()
+
+    expected = dfg.process_data({'scale': 2, 'offset': 1}, start_node='params')
+    assert len(calls) == 6
+    calls.clear()
+    assert dfg.process_data({'scale': 2, 'offset': 1}, start_node='params') == expected
+    assert calls == ['log']
+
+    calls.clear()
+    results = dfg.process_data({'scale': 2, 'offset': 3}, start_node='params')
+    assert results['scaled'] == 20 and results['report'] == 'offset=3'
+    assert sorted(calls) == ['log', 'offset', 'params', 'report', 'scale']  # 'scaled' is reused
+    assert memo.hits > 0
+
+    # Replacing an operation drops its cached results
+    dfg.add_operation('scaled', tracked('scaled', lambda s: s * 100))
+    calls.clear()
+    assert dfg.process_data({'scale': 2, 'offset': 3}, start_node='params')['scaled'] == 200
+    assert sorted(calls) == ['log', 'scaled']
+
+
+def test_result_cache_evicts_least_recently_used():
+    """Test the entry and size bounds of the memoization cache"""
+    np = pytest.importorskip('numpy')
+    cache = ResultCache(max_entries=2)
+    for key in 'abc':
+        if key == 'c':
+            cache.get('a')
+        cache.put(key, key, None)
+    assert 'a' in cache and 'b' not in cache and 'c' in cache
+
+    cache = ResultCache(max_entries=None, max_bytes=1000)
+    cache.put('small', np.zeros(50), None)
+    cache.put('too large', np.zeros(200), None)
+    assert 'too large' not in cache
+    cache.put('medium', np.zeros(100), None)
+    assert 'small' not in cache and cache.nbytes == 800
+
+    assert fingerprint(np.arange(3)) == fingerprint(np.arange(3))
+    assert fingerprint(np.arange(3)) != fingerprint(np.arange(3).astype(float))
+    assert fingerprint(lambda x: x) is None
+
+
+def test_process_stream_matches_per_item_runs():
+    """Test that streamed items follow the same routes as process_data, with fan-out tee'd"""
+    dfg = build_diamond()
+    dfg.add_operation(6, lambda x: x * 3)
+    dfg.add_edge(3, 6)
+
+    streamed = list(dfg.process_stream(range(20), start_node=1, maxsize=2))
+    expected = [dfg.process_data(i, start_node=1) for i in range(20)]
+    assert [item for node, item in streamed if node == 4] == [results[4] for results in expected]
+    assert [item for node, item in streamed if node == 6] == [results[6] for results in expected]
+    assert len(streamed) == 40
+
+
+def test_process_stream_applies_backpressure():
+    """Test that an unbounded source is only read as fast as the consumer pulls"""
+    pulled = []
+
+    def source():
+        i = 0
+        while True:
+            pulled.append(i)
+            yield i
+            i += 1
+
+    dfg = DataFlowGraph()
+    dfg.add_operation('parse', lambda x: x + 1)
+    dfg.add_operation('evens', lambda items: (x for x in items if x % 2 == 0), streaming=True)
+    dfg.add_operation('batches', lambda items: zip(items, items), streaming=True)
+    dfg.add_edge('parse', 'evens')
+    dfg.add_edge('evens', 'batches')
+
+    stream = dfg.process_stream(source(), start_node='parse', maxsize=4)
+    assert [next(stream) for _ in range(3)] == [('batches', (2, 4)), ('batches', (6, 8)), ('batches', (10, 12))]
+    stream.close()
+    assert len(pulled) < 100
+
+
+def test_process_stream_error_propagation():
+    """Test that a failing stage stops the stream and re-raises in the consumer"""
+    def failing_operation(x):
+        if x == 5:
+            raise ValueError("Operation failed")
+        return x
+
+    dfg = DataFlowGraph()
+    dfg.add_operation(1, lambda x: x)
+    dfg.add_operation(2, failing_operation)
+    dfg.add_edge(1, 2)
+    with pytest.raises(ValueError, match="Operation failed"):
+        for _ in dfg.process_stream(iter(range(1_000_000)), start_node=1, maxsize=1):
+            pass
+    assert [thread for thread in threading.enumerate() if thread.name.startswith('process_stream')] == []
+
+
+def test_process_stream_stage_that_stops_reading_early():
+    """Test that the stream ends when a stage stops reading before its producer is done"""
+    dfg = DataFlowGraph()
+    dfg.add_operation('src', lambda x: x)
+    dfg.add_operation('head', lambda items: itertools.islice(items, 3), streaming=True)
+    dfg.add_edge('src', 'head')
+
+    streamed = []
+    consumer = threading.Thread(target=lambda: streamed.extend(dfg.process_stream(range(1000), 'src', maxsize=4)),
+                                daemon=True)
+    consumer.start()
+    consumer.join(timeout=10)
+    assert not consumer.is_alive()
+    assert streamed == [('head', 0), ('head', 1), ('head', 2)]
+    assert [thread for thread in threading.enumerate() if thread.name.startswith('process_stream')] == []
+
+
+class Blob:
+    """A stand-in for a large intermediate value that counts how many instances are alive"""
+    alive = 0
+
+    def __init__(self, value):
+        self.value = value
+        Blob.alive += 1
+
+    def __del__(self):
+        Blob.alive -= 1
+
+
+def test_outputs_release_intermediate_results():
+    """Test that only requested results are returned and intermediates are freed early"""
+    peak = []
+
+    def step(blob):
+        peak.append(Blob.alive)
+        return Blob(blob.value + 1)
+
+    dfg = DataFlowGraph()
+    dfg.add_operation(0, Blob)
+    for i in range(1, 20):
+        dfg.add_operation(i, step)
+        dfg.add_edge(i - 1, i)
+    dfg.add_operation('side', step)
+    dfg.add_edge(10, 'side')
+
+    results = dfg.process_data(0, start_node=0, outputs='sinks')
+    assert sorted(results, key=str) == [19, 'side']
+    assert results[19].value == 19 and results['side'].value == 11
+    assert max(peak) <= 3
+    del results
+
+    peak.clear()
+    results = dfg.process_data(0, start_node=0)
+    assert len(results) == 21 and max(peak) == 20
+    del results
+
+    with pytest.raises(ValueError, match="not reachable"):
+        dfg.process_data(0, start_node=5, outputs=[3])
+
+
+@pytest.mark.parametrize("executor", ['sequential', 'thread'])
+def test_outputs_match_full_results(executor):
+    """Test that selected outputs equal the corresponding full results for every executor"""
+    dfg = build_diamond()
+    expected = dfg.process_data(5, start_node=1)
+    assert dfg.process_data(5, start_node=1, executor=executor, outputs=[2, 4]) == {2: 15, 4: expected[4]}
+    assert dfg.process_data(5, start_node=1, executor=executor, outputs='sinks') == {4: expected[4]}
+    assert asyncio.run(dfg.process_data_async(5, start_node=1, outputs=[3])) == {3: 100}
+    assert dfg.process_batch([5], start_node=1, outputs='sinks') == {4: [expected[4]]}
+
+
+@pytest.mark.parametrize("executor", ['sequential', 'thread'])
+def test_profiler_records_every_node(tmp_path, executor):
+    """Test per-node statistics, exports and the critical path of profiled runs"""
+    def slow(x):
+        time.sleep(0.02)
+        return x
+
+    dfg = build_diamond()
+    dfg.add_operation(3, slow)
+    profiler = Profiler()
+    expected = dfg.process_data(5, start_node=1)
+    for _ in range(2):
+        assert dfg.process_data(5, start_node=1, executor=executor, profiler=profiler) == expected
+
+    stats = profiler.node_stats()
+    assert set(stats) == {1, 2, 3, 4}
+    assert all(entry['calls'] == 2 for entry in stats.values())
+    assert stats[3]['mean_wall'] >= 0.02 and stats[3]['cpu'] < stats[3]['wall']
+    assert stats[4]['output_bytes'] > 0
+    assert all(event['ready'] <= event['start'] <= event['end'] for event in profiler.events)
+    latency, path = profiler.critical_path()
+    assert path == [1, 3, 4] and latency >= 0.02
+
+    profiler.save_json(tmp_path / 'profile.json')
+    profiler.save_chrome_trace(tmp_path / 'trace.json')
+    report = json.loads((tmp_path / 'profile.json').read_text())
+    assert report['runs'] == 2 and report['critical_path']['nodes'] == ['1', '3', '4']
+    trace = json.loads((tmp_path / 'trace.json').read_text())
+    assert len(trace['traceEvents']) == 8
+    assert {event['ph'] for event in trace['traceEvents']} == {'X'}
+
+    with pytest.raises(ValueError, match="Profiling"):
+        dfg.process_data(5, start_node=1, executor='process', profiler=profiler)
+
+
+def test_evaluate_runs_only_required_operations():
+    """Test that pulling one output skips branches it does not depend on"""
+    calls = []
+
+    def tracked(node, operation):
+        return lambda x: calls.append(node) or operation(x)
+
+    dfg = DataFlowGraph()
+    dfg.add_operation('load', tracked('load', lambda x: x + 1))
+    dfg.add_operation('clean', tracked('clean', lambda x: x * 2))
+    dfg.add_operation('model', tracked('model', lambda x: x - 3))
+    dfg.add_operation('histogram', tracked('histogram', lambda x: [x] * 3))
+    dfg.add_operation('summary', tracked('summary', len))
+    for u, v in [('load', 'clean'), ('clean', 'model'), ('load', 'histogram'),
+                 ('histogram', 'summary'), ('clean', 'summary')]:
+        dfg.add_edge(u, v)
+
+    assert dfg.evaluate(outputs=['model'], inputs={'load': 4}) == {'model': 7}
+    assert calls == ['load', 'clean', 'model']
+
+    expected = dfg.process_data(4, start_node='load')
+    calls.clear()
+    assert dfg.evaluate(['summary', 'clean'], {'load': 4}) == {'summary': expected['summary'],
+                                                              'clean': expected['clean']}
+    assert 'model' not in calls
+
+    # An input in the middle of the graph cuts off everything upstream of it
+    calls.clear()
+    assert dfg.evaluate(['model'], {'clean': 10}) == {'model': 17}
+    assert calls == ['clean', 'model']
+    with pytest.raises(ValueError, match="does not depend"):
+        dfg.evaluate(['histogram'], {'clean': 10})
+    with pytest.raises(KeyError):
+        dfg.evaluate(['missing'], {'load': 1})
+
+    dfg.add_operation('offset', lambda x: x + 100)
+    dfg.add_edge('offset', 'model')
+    assert dfg.evaluate(['model'], {'load': 4, 'offset': 0}) == {'model': 7}
+
+
+def test_fused_chains_keep_requested_results():
+    """Test that linear chains are fused unless a result inside them is requested"""
+    dfg = DataFlowGraph()
+    for i in range(200):
+        dfg.add_operation(i, lambda x: x + 1)
+        if i:
+            dfg.add_edge(i - 1, i)
+    dfg.add_operation('branch', lambda x: -x)
+    dfg.add_edge(99, 'branch')
+
+    plan = dfg.compile(0)
+    chains, operations, sources, _ = plan.fused(plan.sinks)
+    assert [len(chain) for chain in chains] == [100, 100, 1]
+    assert dfg.process_data(0, start_node=0, outputs='sinks') == {199: 200, 'branch': -100}
+    assert dfg.process_data(0, start_node=0, outputs=[50, 199]) == {50: 51, 199: 200}
+    assert [len(chain) for chain in plan.fused(plan.select([50, 199]))[0]] == [51, 49, 100, 1]
+
+    columns = dfg.process_batch([0, 1], start_node=0, outputs=[150])
+    assert columns == {150: [151, 152]}
+
+    # A fused chain of picklable operations can be pickled
+    import pickle
+    fused = build_picklable_diamond()
+    fused.add_operation(6, negate)
+    fused.add_edge(5, 6)
+    plan = fused.compile(1)
+    operations = plan.fused(plan.sinks)[1]
+    assert pickle.loads(pickle.dumps(operations[-1]))(5) == operations[-1](5) == -20
+
+
+def test_spilling_store_runs_beyond_memory_budget(tmp_path):
+    """Test that large intermediates are spilled to disk and read back transparently"""
+    np = pytest.importorskip('numpy')
+    dfg = DataFlowGraph()
+    dfg.add_operation('load', lambda n: np.arange(n, dtype=np.float64))
+    dfg.add_operation('square', lambda a: a ** 2)
+    dfg.add_operation('total', lambda a: float(a.sum()))
+    dfg.add_operation('describe', lambda a: {'size': len(a), 'max': float(a.max())})
+    dfg.add_operation('summary', lambda d: sorted(d.items()))
+    for u, v in [('load', 'square'), ('square', 'total'), ('load', 'describe'), ('describe', 'summary')]:
+        dfg.add_edge(u, v)
+    expected = dfg.process_data(100_000, start_node='load')
+
+    with SpillingStore(memory_budget=1_000_000, directory=str(tmp_path)) as store:
+        results = dfg.process_data(100_000, start_node='load', store=store)
+        assert store.spills > 0 and store.nbytes <= store.memory_budget
+        assert isinstance(results['load'], np.memmap) and not results['load'].flags.writeable
+        assert np.array_equal(results['square'], expected['square'])
+        assert results['summary'] == expected['summary'] and results['total'] == expected['total']
+    assert list(tmp_path.iterdir()) == []
+
+    store = SpillingStore(memory_budget=0)
+    assert dfg.process_data(1000, start_node='load', outputs=['summary'], store=store) == {
+        'summary': [('max', 999.0), ('size', 1000)]}
+    assert len(store) == 1 and store.is_spilled('summary')
+    store.close()
+
+    assert dfg.process_data(10, start_node='load', outputs='sinks', store=MemoryStore())['total'] == 285.0
+    with pytest.raises(ValueError, match="sequential"):
+        dfg.process_data(10, start_node='load', executor='thread', store=MemoryStore())
+
+    class IncompleteStore(ResultStore):
+        def put(self, key, value):
+            pass
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+def test_spilling_store_keeps_unpicklable_values_in_memory(tmp_path):
+    """Test that a value that cannot be pickled stays in memory and leaves no partial file"""
+    dfg = DataFlowGraph()
+    dfg.add_operation('offset', lambda x: (lambda y: x + y))
+    dfg.add_operation('apply', lambda add: add(10))
+    dfg.add_edge('offset', 'apply')
+    with SpillingStore(memory_budget=0, directory=str(tmp_path)) as store:
+        results = dfg.process_data(5, start_node='offset', store=store)
+        assert results['offset'](1) == 6 and results['apply'] == 15
+        assert not store.is_spilled('offset') and store.is_spilled('apply')
+        assert [path.suffix for path in tmp_path.iterdir()] == ['.pkl'] and store.spills == 1
+
+        # Values put later are still spilled past the one that stays in memory
+        store.put('numbers', list(range(100)))
+        assert store.is_spilled('numbers') and store.get('numbers') == list(range(100))
+    assert list(tmp_path.iterdir()) == []
+
+
+class DiskCacheCalls:
+    """Records the calls of `expensive_square`. Globals of other kinds are part of its fingerprint."""
+    calls = []
+
+
+def expensive_square(x):
+    DiskCacheCalls.calls.append(x)
+    return x * x
+
+
+def build_cached_pipeline(directory, **kwargs):
+    dfg = DataFlowGraph()
+    dfg.add_operation('square', expensive_square, **kwargs)
+    dfg.add_operation('label', lambda x: f"value={x}")
+    dfg.add_edge('square', 'label')
+    dfg.enable_disk_cache(directory)
+    return dfg
+
+
+def test_disk_cache_is_shared_between_graphs(tmp_path):
+    """Test that results persist across graph instances keyed by operation code and version"""
+    DiskCacheCalls.calls.clear()
+    assert build_cached_pipeline(tmp_path).process_data(3, start_node='square') == {'square': 9, 'label': 'value=9'}
+    assert DiskCacheCalls.calls == [3]
+
+    # A fresh graph, as in a new process, reads the stored results
+    dfg = build_cached_pipeline(tmp_path)
+    assert dfg.process_data(3, start_node='square') == {'square': 9, 'label': 'value=9'}
+    assert DiskCacheCalls.calls == [3] and dfg.disk_cache.hits == 2
+
+    # A new version, or an impure node, is computed again
+    build_cached_pipeline(tmp_path, version=2).process_data(3, start_node='square')
+    build_cached_pipeline(tmp_path, pure=False).process_data(3, start_node='square')
+    assert DiskCacheCalls.calls == [3, 3, 3]
+
+    dfg.add_operation('label', lambda x: f"squared={x}")
+    assert dfg.process_data(3, start_node='square')['label'] == 'squared=9'
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    """Test the size limit and atomic, content-addressed entries of the disk cache"""
+    cache = DiskCache(tmp_path, max_bytes=3000)
+    for i in range(5):
+        cache.put(bytes([i]), b'x' * 900, None)
+        time.sleep(0.01)
+    assert cache.get(bytes([0])) is MISSING and cache.get(bytes([4])) == (b'x' * 900, None)
+    assert cache.nbytes <= 3000
+
+    # A reopened cache indexes the directory once; eviction works from the index
+    cache = DiskCache(tmp_path, max_bytes=3000)
+    assert len(cache) == 3 and cache.nbytes == sum(path.stat().st_size for path in tmp_path.rglob('*') if path.is_file())
+    cache._entries = None  # any further scan would fail
+    cache.get(bytes([2]))
+    for i in range(5, 7):
+        cache.put(bytes([i]), b'x' * 900, None)
+    assert [cache.get(bytes([i])) is MISSING for i in range(2, 7)] == [False, True, True, False, False]
+    assert cache.nbytes <= 3000
+    assert not [path for path in tmp_path.rglob('.*') if path.is_file()]
+
+    # Entries that cannot be loaded any more are misses
+    path = cache._path(b'stale')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(b'cmissing_module\nThing\n.')  # a pickled reference to a class that is gone
+    assert cache.get(b'stale') is MISSING and not os.path.exists(path)
+
+    assert operation_fingerprint(expensive_square) == operation_fingerprint(expensive_square)
+    assert operation_fingerprint(expensive_square) != operation_fingerprint(expensive_square, version=2)
+    assert operation_fingerprint(lambda x: x + 1) != operation_fingerprint(lambda x: x + 2)
+
+
+def test_disk_cache_leaves_foreign_files_alone(tmp_path):
+    """Test that eviction and clear() only delete the cache's own entries"""
+    foreign = [tmp_path / 'README', tmp_path / 'src' / 'notes.txt', tmp_path / 'ab' / 'notes.txt']
+    for path in foreign:
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b'keep me')
+    cache = DiskCache(tmp_path, max_bytes=100)
+    assert len(cache) == 0 and cache.nbytes == 0
+    cache.put(b'k', b'y' * 80, None)
+    cache.put(b'j', b'y' * 80, None)
+    assert len(cache) == 1 and cache.get(b'j') == (b'y' * 80, None)
+    cache.clear()
+    assert len(cache) == 0 and cache.get(b'j') is MISSING
+    assert all(path.read_bytes() == b'keep me' for path in foreign)
+
+
+SCALE = 3
+
+
+def scaled_member(x):
+    return x * SCALE if x in {'alpha', 'beta', 'gamma', 'delta'} else x
+
+
+def test_fingerprints_are_stable_across_processes(monkeypatch):
+    """Test that set-valued inputs and set constants hash alike under any hash seed"""
+    import subprocess
+    import sys
+
+    script = ("import memo, test_dfg\n"
+              "print(memo.fingerprint([{'alpha', 'beta', 'gamma'}, {'key': frozenset({'x', 'y', 'z'})}]).hex(),\n"
+              "      memo.operation_fingerprint(test_dfg.scaled_member).hex())")
+    outputs = set()
+    for seed in ('1', '2', '3'):
+        completed = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                   cwd=os.path.dirname(os.path.abspath(dfg_module.__file__)),
+                                   env=dict(os.environ, PYTHONHASHSEED=seed))
+        outputs.add(completed.stdout)
+    assert len(outputs) == 1
+    assert fingerprint({1, 2}) != fingerprint(frozenset({1, 2})) != fingerprint((1, 2))
+
+    # The module globals an operation reads are part of its fingerprint
+    before = operation_fingerprint(scaled_member)
+    monkeypatch.setattr(sys.modules[__name__], 'SCALE', 4)
+    assert operation_fingerprint(scaled_member) != before
+
+
+def test_remove_vertex_drops_operation():
+    """Test that removing a node invalidates plans and forgets its operation"""
+    dfg = build_diamond()
+    dfg.process_data(5, start_node=1)
+    dfg.remove_vertex(3)
+    assert 3 not in dfg.node_operations
+    assert dfg.process_data(5, start_node=1) == {1: 10, 2: 15, 4: '15'}
+    dfg.remove_edge(2, 4)
+    assert dfg.process_data(5, start_node=1) == {1: 10, 2: 15}
+
+
 def test_operation_type_checking():
     """Test that operations must be callable"""
     dfg = DataFlowGraph()